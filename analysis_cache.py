@@ -0,0 +1,45 @@
+# analysis_cache.py - Candle Buffers and Analysis Memoization
+from collections import OrderedDict
+from typing import Hashable, List, Optional, Tuple
+
+INTERVAL_UNITS_MS = {'m': 60_000, 'h': 3_600_000, 'd': 86_400_000, 'w': 604_800_000}
+
+def interval_ms(interval: str) -> int:
+    """Length of a Binance kline interval ('15m', '1h', '4h', ...) in milliseconds"""
+    return int(interval[:-1]) * INTERVAL_UNITS_MS[interval[-1]]
+
+class LRUCache:
+    """Size-bounded mapping that evicts the least recently used entry"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[object]:
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def peek(self, key: Hashable) -> Optional[object]:
+        """Value without touching recency or the hit counters"""
+        return self._entries.get(key)
+
+    def put(self, key: Hashable, value: object):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def items(self) -> List[Tuple[Hashable, object]]:
+        """Entries, least recently used first"""
+        return list(self._entries.items())
+
+    def __len__(self) -> int:
+        return len(self._entries)
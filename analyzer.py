@@ -1,23 +1,42 @@
 # analyzer.py - Crypto Analysis Engine
 import aiohttp
 import asyncio
+import time
 from datetime import datetime
 import logging
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 import statistics
+from bisect import bisect_left, bisect_right
+from fractions import Fraction
+from urllib.parse import urlencode
 
 from config import (
     BINANCE_ENDPOINTS, TIMEFRAMES, MIN_CONFIDENCE,
     VOLUME_SPIKE_THRESHOLD, MIN_VOLUME_RATIO,
     STRUCTURE_CONFIDENCE_THRESHOLD, TREND_STRENGTH_THRESHOLD,
-    TP_LEVELS, SL_PERCENT, MIN_RR_RATIO
+    TP_LEVELS, SL_PERCENT, MIN_RR_RATIO, INTRABAR_MAX_BARS, ANALYSIS_MODE,
+    CANDLE_CACHE_SIZE, ANALYSIS_CACHE_SIZE, PRIORITY_INTERVAL,
+    LEVEL_MODE, ATR_PERIOD, ATR_SL_MULT, ATR_SL_BUFFER, ATR_SL_MIN, ATR_SL_MAX, ATR_TP_MULTIPLES
 )
+import indicators
+from analysis_cache import LRUCache, interval_ms
+from recorder import get_recorder, get_replayer
+from scan_planner import priority_score
+from strategy_engine import StrategyEngine
 
 logger = logging.getLogger(__name__)
 
 class CryptoAnalyzer:
-    def __init__(self):
+    def __init__(self, mode: str = ANALYSIS_MODE):
         self.session = None
+        # "cascade": stop fetching timeframes once MIN_CONFIDENCE is out of reach
+        self.cascade = mode == 'cascade'
+        self.candle_cache = LRUCache(CANDLE_CACHE_SIZE)
+        self.analysis_cache = LRUCache(ANALYSIS_CACHE_SIZE)
+        self.level_mode = LEVEL_MODE
+        self.engine = StrategyEngine()
+        self.recorder = get_recorder()
+        self.replayer = get_replayer()
     
     async def get_session(self):
         """Get or create aiohttp session"""
@@ -30,64 +49,94 @@ class CryptoAnalyzer:
         if self.session and not self.session.closed:
             await self.session.close()
     
+    async def _get_json(self, url: str, params: Dict, key_params: Dict = None) -> object:
+        """GET a Binance endpoint; every market data request goes through here.
+        
+        Recordings are keyed by ``key_params`` (default: all params).
+        """
+        key = f"{url}?{urlencode(key_params or params)}"
+        if self.replayer:
+            status, data = await self.replayer.respond('binance', key)
+            return data
+        
+        session = await self.get_session()
+        started = time.time()
+        async with session.get(url, params=params) as response:
+            data = await response.json()
+        
+        if self.recorder:
+            self.recorder.record('binance', key, started, time.time() - started, response.status, data)
+        return data
+    
+    def now_ms(self) -> int:
+        """Current time in ms (the recorded time when replaying)"""
+        now = self.replayer.clock() if self.replayer else time.time()
+        return int(now * 1000)
+    
     async def get_current_price(self, symbol: str) -> float:
         """Get current price for a symbol"""
         try:
-            session = await self.get_session()
-            url = f"{BINANCE_ENDPOINTS['price']}?symbol={symbol}"
-            
-            async with session.get(url) as response:
-                data = await response.json()
-                return float(data['price'])
+            data = await self._get_json(BINANCE_ENDPOINTS['price'], {'symbol': symbol})
+            return float(data['price'])
         
         except Exception as e:
-            logger.error(f"Error getting price for {symbol}: {e}")
+            logger.error("Error getting price for %s: %s", symbol, e)
             return 0.0
     
-    async def get_klines(self, symbol: str, interval: str, limit: int = 100) -> List[Dict]:
-        """Get kline/candlestick data"""
+    async def get_klines(self, symbol: str, interval: str, limit: int = 100,
+                         start_time: int = None) -> List[Dict]:
+        """Get kline/candlestick data (optionally starting at start_time, in ms)"""
         try:
-            session = await self.get_session()
-            url = f"{BINANCE_ENDPOINTS['klines']}?symbol={symbol}&interval={interval}&limit={limit}"
+            params = {'symbol': symbol, 'interval': interval, 'limit': limit}
+            if start_time is not None:
+                params['startTime'] = start_time
             
-            async with session.get(url) as response:
-                data = await response.json()
-                
-                candles = []
-                for candle in data:
-                    candles.append({
-                        'time': candle[0],
-                        'open': float(candle[1]),
-                        'high': float(candle[2]),
-                        'low': float(candle[3]),
-                        'close': float(candle[4]),
-                        'volume': float(candle[5])
-                    })
-                
-                return candles
+            # An incremental fetch's limit depends on the clock, so it is left out
+            # of the replay key: the start time already identifies the request
+            key_params = None
+            if start_time is not None:
+                key_params = {'symbol': symbol, 'interval': interval, 'startTime': start_time}
+            data = await self._get_json(BINANCE_ENDPOINTS['klines'], params, key_params)
+            
+            candles = []
+            for candle in data:
+                candles.append({
+                    'time': candle[0],
+                    'open': float(candle[1]),
+                    'high': float(candle[2]),
+                    'low': float(candle[3]),
+                    'close': float(candle[4]),
+                    'volume': float(candle[5]),
+                    'close_time': candle[6]
+                })
+            
+            return candles
         
         except Exception as e:
-            logger.error(f"Error getting klines for {symbol} {interval}: {e}")
+            logger.error("Error getting klines for %s %s: %s", symbol, interval, e)
             return []
     
+    async def get_closed_klines(self, symbol: str, interval: str, start_time: int,
+                                limit: int = INTRABAR_MAX_BARS) -> List[Dict]:
+        """Get closed candles opening at or after start_time (ms)"""
+        candles = await self.get_klines(symbol, interval, limit, start_time=start_time)
+        now_ms = self.now_ms()
+        return [candle for candle in candles if candle['close_time'] < now_ms]
+    
     async def get_24h_ticker(self, symbol: str) -> Dict:
         """Get 24h ticker data"""
         try:
-            session = await self.get_session()
-            url = f"{BINANCE_ENDPOINTS['ticker']}?symbol={symbol}"
-            
-            async with session.get(url) as response:
-                data = await response.json()
-                return {
-                    'volume': float(data['volume']),
-                    'quote_volume': float(data['quoteVolume']),
-                    'price_change_percent': float(data['priceChangePercent']),
-                    'high': float(data['highPrice']),
-                    'low': float(data['lowPrice'])
-                }
+            data = await self._get_json(BINANCE_ENDPOINTS['ticker'], {'symbol': symbol})
+            return {
+                'volume': float(data['volume']),
+                'quote_volume': float(data['quoteVolume']),
+                'price_change_percent': float(data['priceChangePercent']),
+                'high': float(data['highPrice']),
+                'low': float(data['lowPrice'])
+            }
         
         except Exception as e:
-            logger.error(f"Error getting ticker for {symbol}: {e}")
+            logger.error("Error getting ticker for %s: %s", symbol, e)
             return {}
     
     def analyze_trend(self, candles: List[Dict]) -> Dict:
@@ -101,8 +150,17 @@ class CryptoAnalyzer:
         ma20 = statistics.mean(closes[-20:])
         ma50 = statistics.mean(closes[-50:]) if len(closes) >= 50 else ma20
         
-        current_price = closes[-1]
+        # Calculate trend consistency
+        higher_highs = sum(1 for i in range(1, min(10, len(candles))) 
+                          if candles[-i]['high'] > candles[-i-1]['high'])
+        higher_lows = sum(1 for i in range(1, min(10, len(candles))) 
+                         if candles[-i]['low'] > candles[-i-1]['low'])
         
+        return self.trend_from(closes[-1], ma20, ma50, higher_highs, higher_lows)
+    
+    def trend_from(self, current_price: float, ma20: float, ma50: float,
+                   higher_highs: int, higher_lows: int) -> Dict:
+        """Trend direction, strength and consistency from its inputs"""
         # Determine trend
         if current_price > ma20 and ma20 > ma50:
             direction = 'LONG'
@@ -114,12 +172,6 @@ class CryptoAnalyzer:
             direction = 'NEUTRAL'
             strength = 0
         
-        # Calculate trend consistency
-        higher_highs = sum(1 for i in range(1, min(10, len(candles))) 
-                          if candles[-i]['high'] > candles[-i-1]['high'])
-        higher_lows = sum(1 for i in range(1, min(10, len(candles))) 
-                         if candles[-i]['low'] > candles[-i-1]['low'])
-        
         consistency = (higher_highs + higher_lows) / 20 * 100 if direction == 'LONG' else 0
         
         if direction == 'SHORT':
@@ -144,6 +196,10 @@ class CryptoAnalyzer:
         avg_volume = statistics.mean(volumes[:-5])
         recent_volume = statistics.mean(volumes[-5:])
         
+        return self.volume_from(avg_volume, recent_volume)
+    
+    def volume_from(self, avg_volume: float, recent_volume: float) -> Dict:
+        """Volume score from the average and recent (last 5 candles) volume"""
         volume_ratio = recent_volume / avg_volume if avg_volume > 0 else 0
         
         # Check for volume spike
@@ -192,10 +248,150 @@ class CryptoAnalyzer:
             'range': nearest_resistance - nearest_support
         }
     
+    def closed_bar_state(self, candles: List[Dict]) -> Dict:
+        """Everything the analysis needs from the candles before the last (forming) one.
+        
+        Window sums are kept as exact fractions so that adding the forming
+        bar reproduces statistics.mean bit for bit.
+        """
+        closes = [c['close'] for c in candles[:-1]]
+        volumes = [c['volume'] for c in candles]
+        
+        return {
+            'close_sum_19': sum(map(Fraction, closes[-19:]), Fraction(0)),
+            'close_sum_49': sum(map(Fraction, closes[-49:]), Fraction(0)),
+            'higher_highs': sum(1 for i in range(2, 10) if candles[-i]['high'] > candles[-i-1]['high']),
+            'higher_lows': sum(1 for i in range(2, 10) if candles[-i]['low'] > candles[-i-1]['low']),
+            'prev_high': candles[-2]['high'],
+            'prev_low': candles[-2]['low'],
+            'avg_volume': statistics.mean(volumes[:-5]),
+            'volume_sum_4': sum(map(Fraction, volumes[-5:-1]), Fraction(0)),
+            'highs': sorted(c['high'] for c in candles[-50:-1]),
+            'lows': sorted(c['low'] for c in candles[-50:-1])
+        }
+    
+    def finalize_timeframe(self, state: Dict, candles: List[Dict], weight: float) -> Dict:
+        """Same result as analyze_timeframe, from the closed-bar state and the forming bar"""
+        last = candles[-1]
+        current_price = last['close']
+        
+        trend = self.trend_from(
+            current_price,
+            float((state['close_sum_19'] + Fraction(current_price)) / 20),
+            float((state['close_sum_49'] + Fraction(current_price)) / 50),
+            state['higher_highs'] + (last['high'] > state['prev_high']),
+            state['higher_lows'] + (last['low'] > state['prev_low'])
+        )
+        
+        volume = self.volume_from(
+            state['avg_volume'],
+            float((state['volume_sum_4'] + Fraction(last['volume'])) / 5)
+        )
+        
+        # Nearest closed-bar levels around the price, then the forming bar's
+        highs, lows = state['highs'], state['lows']
+        i = bisect_right(highs, current_price)
+        upper = [h for h in (highs[i] if i < len(highs) else None, last['high'])
+                 if h is not None and h > current_price]
+        j = bisect_left(lows, current_price)
+        lower = [l for l in (lows[j - 1] if j > 0 else None, last['low'])
+                 if l is not None and l < current_price]
+        
+        nearest_resistance = min(upper) if upper else max(highs[-1], last['high'])
+        nearest_support = max(lower) if lower else min(lows[0], last['low'])
+        
+        return {
+            'trend': trend,
+            'volume': volume,
+            'levels': {
+                'resistance': nearest_resistance,
+                'support': nearest_support,
+                'range': nearest_resistance - nearest_support
+            },
+            'weight': weight
+        }
+    
+    def analyze_candles(self, symbol: str, interval: str, candles: List[Dict], weight: float) -> Dict:
+        """analyze_timeframe with the closed-bar part memoized per last closed candle"""
+        if len(candles) < 50:
+            return self.analyze_timeframe(candles, weight)
+        
+        # Closed bars never change, so they are identified by the last one's open
+        # time and the window length, the only parameter the state depends on
+        key = (symbol, interval, candles[-2]['time'], len(candles))
+        state = self.analysis_cache.get(key)
+        if state is None:
+            state = self.closed_bar_state(candles)
+            self.analysis_cache.put(key, state)
+        
+        return self.finalize_timeframe(state, candles, weight)
+    
+    def closed_atr(self, symbol: str, interval: str, candles: List[Dict]) -> Optional[float]:
+        """ATR of the closed candles, memoized per last closed candle like analyze_candles"""
+        key = (symbol, interval, 'atr', candles[-2]['time'])
+        value = self.analysis_cache.get(key)
+        if value is None:
+            value = indicators.atr(candles[:-1], ATR_PERIOD)[-1]
+            self.analysis_cache.put(key, value)
+        return value
+    
+    def export_state(self) -> Dict:
+        """Candle buffers and memoized analysis states, for a runtime snapshot"""
+        return {
+            'candles': [[list(key), candles] for key, candles in self.candle_cache.items()],
+            'analysis': [[list(key), state] for key, state in self.analysis_cache.items()]
+        }
+    
+    def import_state(self, state: Dict):
+        """Restore buffers and memoized states saved by export_state"""
+        for key, candles in state.get('candles', []):
+            self.candle_cache.put(tuple(key), candles)
+        for key, analysis_state in state.get('analysis', []):
+            self.analysis_cache.put(tuple(key), analysis_state)
+        
+        logger.info("Restored %d candle buffers, %d analysis states",
+                    len(self.candle_cache), len(self.analysis_cache))
+    
+    def priority_scores(self, coins: List[str]) -> Dict[str, Optional[float]]:
+        """Scan priority of each coin from its buffered candles (None when not buffered)"""
+        scores = {}
+        for coin in coins:
+            candles = self.candle_cache.peek((coin, PRIORITY_INTERVAL))
+            scores[coin] = priority_score(candles) if candles else None
+        return scores
+    
+    async def backfill(self):
+        """Bring every restored candle buffer up to date, fetching only the missing bars"""
+        for (symbol, interval), candles in self.candle_cache.items():
+            await self.get_candles(symbol, interval, len(candles))
+    
+    async def get_candles(self, symbol: str, interval: str, limit: int) -> List[Dict]:
+        """Latest `limit` candles, fetching only the bars missing from the buffer"""
+        key = (symbol, interval)
+        buffer = self.candle_cache.get(key)
+        
+        if buffer and len(buffer) >= limit:
+            # The buffered forming bar plus every bar opened since
+            missing = (self.now_ms() - buffer[-1]['time']) // interval_ms(interval) + 2
+            if missing < limit:
+                fresh = await self.get_klines(symbol, interval, missing, start_time=buffer[-1]['time'])
+                if fresh and fresh[0]['time'] == buffer[-1]['time']:
+                    candles = (buffer[:-1] + fresh)[-limit:]
+                    self.candle_cache.put(key, candles)
+                    return candles
+        
+        candles = await self.get_klines(symbol, interval, limit)
+        if candles:
+            self.candle_cache.put(key, candles)
+        return candles
+    
     def calculate_entry_exit(self, current_price: float, direction: str, 
-                            support: float, resistance: float) -> Dict:
+                            support: float, resistance: float, atr: float = None) -> Dict:
         """Calculate entry, stop loss, and take profit levels"""
         
+        if self.level_mode == 'atr' and atr:
+            return self.calculate_atr_levels(current_price, direction, support, resistance, atr)
+        
         if direction == 'LONG':
             entry = current_price * 0.999  # Slightly below current price
             stop_loss = entry * (1 - SL_PERCENT)
@@ -233,94 +429,126 @@ class CryptoAnalyzer:
             'rr_ratio': round(rr_ratio, 2)
         }
     
+    def analyze_timeframe(self, candles: List[Dict], weight: float) -> Dict:
+        """Trend, volume and levels of one timeframe"""
+        return {
+            'trend': self.analyze_trend(candles),
+            'volume': self.analyze_volume(candles),
+            'levels': self.find_support_resistance(candles),
+            'weight': weight
+        }
+    
+    def pick_strategy(self, results: Dict) -> Tuple[str, int, Optional[str]]:
+        """First strategy reaching MIN_CONFIDENCE, otherwise the most confident one"""
+        best = None
+        for name, (confidence, direction) in results.items():
+            if direction is None:
+                continue
+            if confidence >= MIN_CONFIDENCE:
+                return name, confidence, direction
+            if best is None or confidence > best[1]:
+                best = (name, confidence, direction)
+        
+        return best or (None, 0, None)
+    
+    def calculate_atr_levels(self, current_price: float, direction: str,
+                             support: float, resistance: float, atr: float) -> Dict:
+        """Entry, stop loss and take profits sized by ATR.
+        
+        The stop goes just beyond the nearest support (LONG) or resistance
+        (SHORT) when that lies within ATR_SL_MIN..ATR_SL_MAX ATRs of entry,
+        otherwise ATR_SL_MULT ATRs away. Take profits sit at ATR_TP_MULTIPLES.
+        The stop is capped at ATR_SL_MAX ATRs, so rr_ratio (to TP4) is at
+        least ATR_TP_MULTIPLES[-1] / ATR_SL_MAX and MIN_RR_RATIO does not filter.
+        """
+        sign = 1 if direction == 'LONG' else -1
+        entry = current_price * (0.999 if direction == 'LONG' else 1.001)
+        
+        # Distance from entry to the stop beyond the level on the losing side
+        level = support if direction == 'LONG' else resistance
+        structure_distance = sign * (entry - level) + ATR_SL_BUFFER * atr if level > 0 else 0
+        
+        if ATR_SL_MIN * atr <= structure_distance <= ATR_SL_MAX * atr:
+            sl_distance = structure_distance
+        else:
+            sl_distance = ATR_SL_MULT * atr
+        
+        stop_loss = entry - sign * sl_distance
+        take_profits = [entry + sign * multiple * atr for multiple in ATR_TP_MULTIPLES]
+        
+        # Calculate Risk/Reward ratio
+        rr_ratio = abs(take_profits[-1] - entry) / sl_distance
+        
+        return {
+            'entry': round(entry, 6),
+            'stop_loss': round(stop_loss, 6),
+            'take_profits': [round(tp, 6) for tp in take_profits],
+            'rr_ratio': round(rr_ratio, 2)
+        }
+    
+    async def collect_timeframes(self, symbol: str) -> Tuple[Dict, Optional[float]]:
+        """Fetch and analyze timeframes; returns (analyses, bound).
+        
+        In cascade mode timeframes are analyzed by descending weight and the
+        loop stops as soon as MIN_CONFIDENCE is out of reach; bound is then
+        the highest confidence that was still possible, otherwise None.
+        """
+        if self.cascade:
+            order = sorted(TIMEFRAMES, key=lambda tf: TIMEFRAMES[tf]['weight'], reverse=True)
+        else:
+            order = list(TIMEFRAMES)
+        
+        timeframe_analyses = {}
+        
+        for i, tf in enumerate(order):
+            params = TIMEFRAMES[tf]
+            candles = await self.get_candles(symbol, tf, params['limit'])
+            if candles:
+                # Indicators the strategies add on top of the memoized base analysis
+                timeframe_analyses[tf] = self.engine.compute(
+                    candles, self.analyze_candles(symbol, tf, candles, params['weight'])
+                )
+                # Trade levels read the 1h ATR only
+                if self.level_mode == 'atr' and tf == '1h' and len(candles) > ATR_PERIOD + 1:
+                    timeframe_analyses[tf]['atr'] = self.closed_atr(symbol, tf, candles)
+            
+            pending = order[i + 1:]
+            if self.cascade and pending:
+                bound = self.engine.bound(timeframe_analyses, pending)
+                # Below MIN_CONFIDENCE - 0.5 even the rounded confidence cannot reach it
+                if bound < MIN_CONFIDENCE - 0.5:
+                    return timeframe_analyses, bound
+        
+        return timeframe_analyses, None
+    
     async def analyze_coin(self, symbol: str) -> Dict:
         """Complete analysis of a coin"""
         try:
-            logger.info(f"Analyzing {symbol}...")
+            logger.debug("Analyzing %s...", symbol)
             
             # Get data for multiple timeframes
-            timeframe_analyses = {}
-            all_candles = {}
+            timeframe_analyses, bound = await self.collect_timeframes(symbol)
             
-            for tf, params in TIMEFRAMES.items():
-                candles = await self.get_klines(symbol, tf, params['limit'])
-                if candles:
-                    all_candles[tf] = candles
-                    
-                    trend = self.analyze_trend(candles)
-                    volume = self.analyze_volume(candles)
-                    levels = self.find_support_resistance(candles)
-                    
-                    timeframe_analyses[tf] = {
-                        'trend': trend,
-                        'volume': volume,
-                        'levels': levels,
-                        'weight': params['weight']
-                    }
+            if bound is not None:
+                if logger.isEnabledFor(logging.INFO):
+                    logger.info("%s: Confidence at most %.0f%% after %s - Below threshold",
+                                symbol, bound, ', '.join(timeframe_analyses) or 'no data')
+                return {'confidence': int(round(bound))}
             
             if not timeframe_analyses:
-                logger.warning(f"No data available for {symbol}")
+                logger.warning("No data available for %s", symbol)
                 return {'confidence': 0}
             
-            # Combine analyses from all timeframes
-            combined_score = 0
-            total_weight = 0
-            directions = []
-            
-            for tf, analysis in timeframe_analyses.items():
-                trend = analysis['trend']
-                volume = analysis['volume']
-                weight = analysis['weight']
-                
-                # Calculate score for this timeframe
-                tf_score = 0
-                
-                # Trend score (40%)
-                if trend['strength'] >= TREND_STRENGTH_THRESHOLD:
-                    tf_score += 40
-                
-                # Consistency score (30%)
-                if trend['consistency'] >= 70:
-                    tf_score += 30
-                
-                # Volume score (30%)
-                if volume['score'] >= 80:
-                    tf_score += 30
-                
-                combined_score += tf_score * weight
-                total_weight += weight
-                
-                if trend['direction'] != 'NEUTRAL':
-                    directions.append(trend['direction'])
-            
-            # Average score
-            final_score = (combined_score / total_weight) if total_weight > 0 else 0
-            
-            # Determine final direction
-            if not directions:
-                return {'confidence': 0}
-            
-            long_count = directions.count('LONG')
-            short_count = directions.count('SHORT')
-            
-            if long_count > short_count:
-                final_direction = 'LONG'
-                alignment_bonus = (long_count / len(directions)) * 100
-            elif short_count > long_count:
-                final_direction = 'SHORT'
-                alignment_bonus = (short_count / len(directions)) * 100
-            else:
+            # Combine analyses from all timeframes, per strategy
+            strategy, confidence, final_direction = self.pick_strategy(
+                self.engine.evaluate(timeframe_analyses)
+            )
+            if final_direction is None:
                 return {'confidence': 0}
             
-            # Adjust final score with alignment
-            final_score = (final_score + alignment_bonus) / 2
-            
-            # Round to integer
-            confidence = int(round(final_score))
-            
             # If confidence is not 100%, return early
             if confidence < MIN_CONFIDENCE:
-                logger.info(f"{symbol}: Confidence {confidence}% - Below threshold")
+                logger.info("%s: Confidence %d%% - Below threshold", symbol, confidence)
                 return {'confidence': confidence}
             
             # Get current price and levels
@@ -332,15 +560,16 @@ class CryptoAnalyzer:
                 current_price,
                 final_direction,
                 main_tf_levels['support'],
-                main_tf_levels['resistance']
+                main_tf_levels['resistance'],
+                timeframe_analyses['1h'].get('atr')
             )
             
             # Check RR ratio
             if trade_levels['rr_ratio'] < MIN_RR_RATIO:
-                logger.info(f"{symbol}: RR ratio {trade_levels['rr_ratio']} - Below minimum")
+                logger.info("%s: RR ratio %s - Below minimum", symbol, trade_levels['rr_ratio'])
                 return {'confidence': 0}
             
-            logger.info(f"{symbol}: ✅ Signal found! Confidence: {confidence}%, Direction: {final_direction}")
+            logger.info("%s: ✅ Signal found! Confidence: %d%%, Direction: %s", symbol, confidence, final_direction)
             
             return {
                 'symbol': symbol,
@@ -350,10 +579,11 @@ class CryptoAnalyzer:
                 'stop_loss': trade_levels['stop_loss'],
                 'take_profits': trade_levels['take_profits'],
                 'rr_ratio': trade_levels['rr_ratio'],
+                'strategy': strategy,
                 'current_price': current_price,
                 'analysis_time': datetime.now().isoformat()
             }
         
         except Exception as e:
-            logger.error(f"Error analyzing {symbol}: {e}")
+            logger.error("Error analyzing %s: %s", symbol, e)
             return {'confidence': 0}
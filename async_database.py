@@ -0,0 +1,91 @@
+# async_database.py - Non-blocking Database Access
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from config import DB_READER_THREADS, WRITE_BUFFER_INTERVAL
+from database import Database
+
+logger = logging.getLogger(__name__)
+
+# Methods that modify the database run one at a time on the writer thread
+WRITE_METHODS = {
+    'add_user', 'block_user', 'unblock_user', 'set_subscription',
+    'add_admin', 'remove_admin', 'add_signal', 'update_signal_status',
+    'mark_coin_analyzed', 'mark_signal_checked', 'flush_writes', 'flush_writes_if_due',
+    'deactivate_user', 'archive_signals', 'prune_users', 'incremental_vacuum',
+    'run_retention', 'acquire_lease', 'release_lease',
+}
+
+# Methods answered from the in-memory roster/subscription index/cooldowns run inline
+MEMORY_METHODS = {
+    'is_user_blocked', 'get_all_active_users', 'get_subscription',
+    'get_signal_audience', 'is_admin', 'get_all_admins', 'was_recently_analyzed',
+}
+
+class AsyncDatabase:
+    """Awaitable façade over ``Database`` with the same method names.
+
+    Writes are serialized on a single writer thread and reads go to a small
+    pool of reader threads, each with its own WAL read connection, so no
+    SQLite I/O or lock wait ever runs on the event loop.
+    """
+
+    def __init__(self, db: Database, readers: int = DB_READER_THREADS):
+        self.db = db
+        self.roster = db.roster
+        self.subscriptions = db.subscriptions
+        self.cooldowns = db.cooldowns
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-writer')
+        self._readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix='db-reader')
+        self._flush_task = None
+
+    def __getattr__(self, name: str):
+        attr = getattr(self.db, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+
+        if name in MEMORY_METHODS:
+            async def call_inline(*args, **kwargs):
+                return attr(*args, **kwargs)
+            method = call_inline
+        else:
+            executor = self._writer if name in WRITE_METHODS else self._readers
+
+            async def call_in_thread(*args, **kwargs):
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(executor, functools.partial(attr, *args, **kwargs))
+            method = call_in_thread
+
+        method.__name__ = name
+        method.__doc__ = attr.__doc__
+        # Cache the wrapper so later lookups skip __getattr__
+        setattr(self, name, method)
+        return method
+
+    def start(self):
+        """Start flushing write-behind writes on the writer thread"""
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(WRITE_BUFFER_INTERVAL)
+            try:
+                await self.flush_writes_if_due()
+            except Exception as e:
+                logger.error("Error flushing buffered writes: %s", e)
+
+    async def close(self):
+        """Drain buffered writes, stop the worker threads and close connections"""
+        if self._flush_task:
+            self._flush_task.cancel()
+            self._flush_task = None
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._readers.shutdown)
+        # Database.close flushes the write-behind buffer, on the writer thread
+        await loop.run_in_executor(self._writer, self.db.close)
+        self._writer.shutdown(wait=False)
+        logger.info("Database closed")
@@ -0,0 +1,147 @@
+# benchmarks/bench_database.py - Per-call latency of Database operations
+#
+# Compares the old access pattern (a connection per call, default rollback
+# journal, DATE(sent_time) filters) with the current Database implementation.
+#
+#   python -m benchmarks.bench_database [--signals 100000] [--calls 300]
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from database import Database
+
+COINS = ["BTCUSDT", "ETHUSDT", "BNBUSDT", "SOLUSDT", "XRPUSDT",
+         "ADAUSDT", "DOGEUSDT", "MATICUSDT", "DOTUSDT", "AVAXUSDT"]
+
+ACTIVE_SQL = '''
+    SELECT id, signal_number, coin, direction, entry, stop_loss,
+           tp1, tp2, tp3, tp4, rr_ratio, sent_time
+    FROM signals WHERE status = 'active'
+'''
+COUNT_SQL = 'SELECT COUNT(*) FROM signals WHERE DATE(sent_time) = ?'
+MARK_SQL = '''
+    INSERT OR REPLACE INTO analyzed_coins (coin, last_analysis)
+    VALUES (?, CURRENT_TIMESTAMP)
+'''
+DAILY_STATS_SQL = [
+    'SELECT COUNT(*) FROM signals WHERE DATE(sent_time) = ?',
+    "SELECT COUNT(*) FROM signals WHERE DATE(sent_time) = ? AND status = 'completed' AND profit_percent > 0",
+    "SELECT COUNT(*) FROM signals WHERE DATE(sent_time) = ? AND status = 'stopped'",
+    "SELECT COUNT(*) FROM signals WHERE DATE(sent_time) = ? AND status = 'active'",
+    "SELECT SUM(profit_percent) FROM signals WHERE DATE(sent_time) = ? AND status IN ('completed', 'stopped')",
+]
+STATUS_SQL = '''
+    UPDATE signals SET status = ?, profit_percent = ?, closed_time = CURRENT_TIMESTAMP
+    WHERE id = ?
+'''
+
+def seed(db_file: str, signals: int, active: int, users: int):
+    """Fill a fresh database with realistic row counts"""
+    Database(db_file).close()
+
+    conn = sqlite3.connect(db_file)
+    now = datetime.utcnow()
+    rows = []
+    for i in range(signals):
+        sent = now - timedelta(minutes=15 * (signals - i))
+        status = 'active' if i >= signals - active else random.choice(['completed', 'stopped'])
+        entry = random.uniform(1, 1000)
+        rows.append((i % 40 + 1, random.choice(COINS), random.choice(['LONG', 'SHORT']),
+                     entry, entry * 0.95, entry * 1.01, entry * 1.025, entry * 1.045, entry * 1.1,
+                     2.0, sent.strftime('%Y-%m-%d %H:%M:%S'), status, random.uniform(-5, 10)))
+    conn.executemany('''
+        INSERT INTO signals
+        (signal_number, coin, direction, entry, stop_loss, tp1, tp2, tp3, tp4,
+         rr_ratio, sent_time, status, profit_percent)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+    conn.executemany('INSERT INTO users (user_id, username, first_name) VALUES (?, ?, ?)',
+                     [(i, f"user{i}", "User") for i in range(1, users + 1)])
+    conn.commit()
+    conn.close()
+
+class PerCallConnection:
+    """The previous access pattern: open, query, commit and close on every call"""
+
+    def __init__(self, db_file: str):
+        self.db_file = db_file
+
+    def run(self, sql: str, params: tuple = (), write: bool = False):
+        conn = sqlite3.connect(self.db_file)
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        result = cursor.fetchall()
+        if write:
+            conn.commit()
+        conn.close()
+        return result
+
+def legacy_operations(legacy: PerCallConnection, signal_ids):
+    today = datetime.now().date()
+    return {
+        'get_active_signals': lambda: legacy.run(ACTIVE_SQL),
+        'get_today_signal_count': lambda: legacy.run(COUNT_SQL, (today,)),
+        'get_daily_stats': lambda: [legacy.run(sql, (today,)) for sql in DAILY_STATS_SQL],
+        'mark_coin_analyzed': lambda: legacy.run(MARK_SQL, (random.choice(COINS),), write=True),
+        'update_signal_status': lambda: legacy.run(
+            STATUS_SQL, ('active', 0, random.choice(signal_ids)), write=True),
+    }
+
+def persistent_operations(db: Database, signal_ids):
+    return {
+        'get_active_signals': db.get_active_signals,
+        'get_today_signal_count': db.get_today_signal_count,
+        'get_daily_stats': db.get_daily_stats,
+        'mark_coin_analyzed': lambda: db.mark_coin_analyzed(random.choice(COINS)),
+        'update_signal_status': lambda: db.update_signal_status(random.choice(signal_ids), 'active', 0),
+    }
+
+def measure(fn, calls: int) -> float:
+    """Mean latency in microseconds"""
+    fn()
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description="Database per-call latency benchmark")
+    parser.add_argument('--signals', type=int, default=100000)
+    parser.add_argument('--active', type=int, default=50)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--calls', type=int, default=300)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, 'bench.db')
+        seed(db_file, args.signals, args.active, args.users)
+
+        legacy = PerCallConnection(db_file)
+        # The baseline runs with the default rollback journal, as before
+        legacy.run('PRAGMA journal_mode=DELETE')
+        signal_ids = [row[0] for row in legacy.run("SELECT id FROM signals WHERE status = 'active'")]
+
+        legacy_times = {
+            name: measure(call, args.calls)
+            for name, call in legacy_operations(legacy, signal_ids).items()
+        }
+
+        db = Database(db_file)
+        persistent_times = {
+            name: measure(call, args.calls)
+            for name, call in persistent_operations(db, signal_ids).items()
+        }
+        db.close()
+
+    print(f"{args.signals} signals, {args.active} active, {args.users} users, {args.calls} calls each")
+    print(f"{'operation':<24}{'before (us)':>20}{'after (us)':>18}{'speedup':>10}")
+    for name, before in legacy_times.items():
+        after = persistent_times[name]
+        print(f"{name:<24}{before:>20.1f}{after:>18.1f}{before / after:>9.1f}x")
+
+if __name__ == '__main__':
+    main()
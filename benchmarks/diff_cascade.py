@@ -0,0 +1,122 @@
+# benchmarks/diff_cascade.py - Differential check of cascade vs full analysis
+#
+# Runs analyze_coin in "full" and "cascade" mode over the same synthetic
+# candles and checks that both accept exactly the same coins with identical
+# signals, and that a rejected coin's cascade confidence is an upper bound
+# of the full one that is still below threshold. Also reports kline requests
+# and CPU time saved by the cascade.
+#
+#   python -m benchmarks.diff_cascade [--coins 2000] [--seed 1] [--min-confidence 100]
+import argparse
+import asyncio
+import logging
+import random
+import time
+
+import analyzer as analyzer_module
+from analyzer import CryptoAnalyzer
+from config import TIMEFRAMES
+
+REGIMES = ['strong_up', 'strong_down', 'up', 'down', 'flat']
+
+def make_candles(rng: random.Random, regime: str, limit: int, spike: bool):
+    """Synthetic candles: a drift per regime plus noise, optional volume spike at the end"""
+    drift = {'strong_up': 0.025, 'strong_down': -0.025, 'up': 0.002,
+             'down': -0.002, 'flat': 0.0}[regime]
+    price = rng.uniform(1, 1000)
+    candles = []
+    for i in range(limit):
+        open_price = price
+        price *= 1 + drift + rng.gauss(0, 0.002)
+        volume = rng.uniform(80, 120) * (2.5 if spike and i >= limit - 5 else 1)
+        candles.append({
+            'time': i * 60000,
+            'open': open_price,
+            'high': max(open_price, price) * (1 + abs(rng.gauss(0, 0.001))),
+            'low': min(open_price, price) * (1 - abs(rng.gauss(0, 0.001))),
+            'close': price,
+            'volume': volume,
+            'close_time': i * 60000 + 59999
+        })
+    return candles
+
+class ReplayAnalyzer(CryptoAnalyzer):
+    """Analyzer fed from pre-generated candles instead of the exchange"""
+
+    def __init__(self, mode: str, market: dict):
+        super().__init__(mode)
+        self.market = market
+        self.requests = 0
+
+    async def get_klines(self, symbol, interval, limit=100, start_time=None):
+        self.requests += 1
+        return self.market[symbol]['klines'][interval]
+
+    async def get_current_price(self, symbol):
+        self.requests += 1
+        return self.market[symbol]['price']
+
+def build_market(coins: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    market = {}
+    for n in range(coins):
+        # Bias towards agreeing timeframes so a share of coins passes
+        base = rng.choice(REGIMES)
+        klines = {}
+        for tf, params in TIMEFRAMES.items():
+            regime = base if rng.random() < 0.7 else rng.choice(REGIMES)
+            klines[tf] = make_candles(rng, regime, params['limit'], rng.random() < 0.6)
+        market[f"COIN{n}USDT"] = {'klines': klines, 'price': klines['1h'][-1]['close']}
+    return market
+
+async def run(mode: str, market: dict):
+    analyzer = ReplayAnalyzer(mode, market)
+    start = time.process_time()
+    results = {symbol: await analyzer.analyze_coin(symbol) for symbol in market}
+    return results, analyzer.requests, time.process_time() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--coins', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--min-confidence', type=int, default=analyzer_module.MIN_CONFIDENCE)
+    args = parser.parse_args()
+
+    analyzer_module.MIN_CONFIDENCE = args.min_confidence
+
+    logging.disable(logging.CRITICAL)
+    market = build_market(args.coins, args.seed)
+
+    full, full_requests, full_cpu = asyncio.run(run('full', market))
+    cascade, cascade_requests, cascade_cpu = asyncio.run(run('cascade', market))
+
+    mismatches = []
+    accepted = 0
+    for symbol in market:
+        a, b = dict(full[symbol]), dict(cascade[symbol])
+        a.pop('analysis_time', None)
+        b.pop('analysis_time', None)
+        passed = a['confidence'] >= args.min_confidence and 'direction' in a
+        accepted += passed
+
+        if passed or 'direction' in b:
+            # Accepted coins must produce the identical signal
+            if a != b:
+                mismatches.append((symbol, a, b))
+        elif b['confidence'] >= args.min_confidence or b['confidence'] < a['confidence']:
+            # Rejected: cascade reports an upper bound that is still below threshold
+            mismatches.append((symbol, a, b))
+
+    print(f"{args.coins} coins, {accepted} accepted")
+    print(f"{'mode':<10}{'kline+price requests':>22}{'cpu (s)':>10}")
+    print(f"{'full':<10}{full_requests:>22}{full_cpu:>10.3f}")
+    print(f"{'cascade':<10}{cascade_requests:>22}{cascade_cpu:>10.3f}")
+
+    if mismatches:
+        for symbol, a, b in mismatches[:10]:
+            print(f"MISMATCH {symbol}: full={a} cascade={b}")
+        raise SystemExit(f"{len(mismatches)} mismatches")
+    print("OK: identical decisions and signals")
+
+if __name__ == '__main__':
+    main()
@@ -2,31 +2,102 @@
 import os
 import asyncio
 import logging
+from signal import SIGINT, SIGTERM
 from datetime import datetime, timedelta
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters, ContextTypes
+from telegram.error import Forbidden
 import json
+import socket
+from typing import Dict, List, Optional
 
-from config import TOKEN, ADMIN_ID, TOP_COINS, SCAN_INTERVALS
+from config import (
+    TOKEN, ADMIN_ID, TOP_COINS, SCAN_INTERVALS, DELIVERY_MODE, RETENTION_HOUR,
+    INTRABAR_INTERVAL, TIMEFRAMES, REGIME_INTERVAL, REGIME_WINDOW, SNAPSHOT_INTERVAL,
+    CLUSTER_ROLE, NOTIFIER_LEASE_TTL, SIGNAL_CHARTS, CHART_INTERVAL, CHART_CANDLES,
+    EVENT_TRIGGERS, RECORD_MODE, MIN_CONFIDENCE, DATABASE_FILE, SNAPSHOT_FILE, REPLAY_SNAPSHOT_FILE
+)
 from analyzer import CryptoAnalyzer
-from database import Database
+from database import Database, period_start
+from async_database import AsyncDatabase
 from signal_manager import SignalManager
-from utils import format_signal_message, format_tp_message, format_daily_summary
-
-# Setup logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
+from scan_planner import ScanPlanner
+from regime import MarketRegime
+from snapshot import SnapshotStore
+from chart import SignalCharts
+from event_triggers import TriggerWatcher
+from cluster import ShardCoordinator, scan_slot, run_worker
+from utils import (
+    format_signal_message, format_tp_message, format_daily_summary,
+    format_subscription, validate_symbol, format_performance_report, PERIOD_LABELS
 )
+from webhook import WebhookServer
+from logging_setup import setup_logging, log_context, DeliveryReport
+from recorder import RecordingRequest, get_recorder, get_replayer, prepare_replay_database
+
+# Setup logging (records are written on a background thread)
+setup_logging()
 logger = logging.getLogger(__name__)
 
+class AdminFilter(filters.MessageFilter):
+    """Match messages sent by admins, checked against the live roster"""
+    
+    def __init__(self, roster):
+        super().__init__(name="AdminFilter")
+        self.roster = roster
+    
+    def filter(self, message) -> bool:
+        return message.from_user is not None and self.roster.is_admin(message.from_user.id)
+
 class ScalpingBot:
     def __init__(self):
-        self.app = Application.builder().token(TOKEN).build()
-        self.db = Database()
+        builder = (
+            Application.builder().token(TOKEN)
+            .post_init(self.on_startup)
+            .post_shutdown(self.on_shutdown)
+        )
+        recorder, replayer = get_recorder(), get_replayer()
+        if recorder or replayer:
+            # Same pool sizes as the builder's defaults
+            builder = (
+                builder
+                .request(RecordingRequest(recorder, replayer, connection_pool_size=256))
+                .get_updates_request(RecordingRequest(recorder, replayer, connection_pool_size=1))
+            )
+        self.app = builder.build()
+        self.db = AsyncDatabase(Database(prepare_replay_database() if replayer else DATABASE_FILE))
         self.analyzer = CryptoAnalyzer()
         self.signal_manager = SignalManager(self.db)
+        self.scan_planner = ScanPlanner(self.db.cooldowns)
+        self.regime = MarketRegime()
+        # Same limit as the analysis timeframe, so both share one candle buffer
+        self.regime_limit = max(REGIME_WINDOW + 1, TIMEFRAMES.get(REGIME_INTERVAL, {}).get('limit', 0))
         self.is_scanning = True
+        # Built up front so other endpoints can be mounted on it before it starts
+        self.webhook_server = WebhookServer(self.app) if DELIVERY_MODE == "webhook" else None
+        self.stop_event = None
+        self.snapshots = SnapshotStore(REPLAY_SNAPSHOT_FILE if replayer else SNAPSHOT_FILE)
+        self.charts = SignalCharts()
+        self.snapshot_task = None
+        self.backfill_task = None
+        self.scan_task = None
+        # Last run of once-per-slot tasks, kept across restarts by the snapshot
+        self.last_runs = {}
+        # Only the lease holder sends signals; in notifier mode workers do the scanning
+        self.lease_holder = f"{socket.gethostname()}-{os.getpid()}"
+        self.lease_task = None
+        self.coordinator = None
+        if CLUSTER_ROLE == "notifier":
+            self.coordinator = ShardCoordinator(self.process_cluster_candidates, self.db.cooldowns)
+        # Scans and triggered analyses may propose the same coin at once
+        self.send_lock = asyncio.Lock()
+        self.send_tasks = set()
+        # Live-feed triggers between scans (run by the workers in notifier mode;
+        # the websocket is not recorded, so replays go without them)
+        self.triggers = None
+        self.trigger_task = None
+        if EVENT_TRIGGERS and RECORD_MODE != "replay" and not self.coordinator:
+            self.triggers = TriggerWatcher(self.analyzer, self.process_coin, self.db.cooldowns, TOP_COINS)
         
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /start command"""
@@ -35,10 +106,10 @@ class ScalpingBot:
         username = user.username or "Unknown"
         
         # Save user to database
-        self.db.add_user(user_id, username, user.first_name)
+        await self.db.add_user(user_id, username, user.first_name)
         
         # Check if user is blocked
-        if self.db.is_user_blocked(user_id):
+        if await self.db.is_user_blocked(user_id):
             await update.message.reply_text("❌ Bạn đã bị chặn sử dụng bot này.")
             return
         
@@ -54,6 +125,7 @@ class ScalpingBot:
 📊 Lệnh có sẵn:
 /start - Khởi động bot
 /stats - Xem thống kê
+/subscription - Tùy chọn nhận tín hiệu
 /help - Trợ giúp"""
         
         await update.message.reply_text(welcome_message)
@@ -79,7 +151,7 @@ class ScalpingBot:
     
     async def stats(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Show user statistics"""
-        stats = self.db.get_daily_stats()
+        stats = await self.db.get_daily_stats()
         
         stats_message = f"""📊 Thống kê hôm nay:
         
@@ -89,6 +161,13 @@ class ScalpingBot:
 📈 Đang theo dõi: {stats['active_signals']}
 💰 Tổng lợi nhuận: {stats['total_profit']:.2f}%"""
         
+        coverage = self.coordinator.coverage if self.coordinator else self.scan_planner.coverage
+        if coverage and await self.db.is_admin(update.effective_user.id):
+            stats_message += (f"\n\n🔎 Lần quét gần nhất: {coverage['analyzed']}/{coverage['eligible']} coin, "
+                              f"{coverage['carried']} coin dời sang lần sau")
+            if self.triggers:
+                stats_message += f"\n⚡ Phân tích theo sự kiện: {self.triggers.fired}"
+        
         await update.message.reply_text(stats_message)
     
     async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -106,21 +185,84 @@ class ScalpingBot:
 • Bot chỉ để tham khảo
 • Luôn có Stop Loss
 
+🔔 Tùy chọn tín hiệu:
+/coins BTC ETH - Chỉ nhận tín hiệu các coin này
+/direction LONG|SHORT|ALL - Chọn hướng lệnh
+/minrr 2 - RR tối thiểu
+/subscription - Xem tùy chọn hiện tại
+
 📞 Liên hệ: @HOANGDUNGG789"""
         
         await update.message.reply_text(help_text)
     
+    async def subscription_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Show current signal subscription"""
+        sub = await self.db.get_subscription(update.effective_user.id)
+        await update.message.reply_text(format_subscription(sub.to_dict()))
+    
+    async def coins_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Choose which coins to receive signals for"""
+        if not context.args:
+            await update.message.reply_text("📌 Cách dùng: /coins BTC ETH hoặc /coins all")
+            return
+        
+        if context.args[0].lower() == 'all':
+            coins = []
+        else:
+            coins = []
+            for arg in context.args:
+                symbol = arg.upper()
+                if not symbol.endswith('USDT'):
+                    symbol += 'USDT'
+                
+                if not validate_symbol(symbol) or symbol not in TOP_COINS:
+                    supported = ", ".join(c.replace('USDT', '') for c in TOP_COINS)
+                    await update.message.reply_text(
+                        f"❌ Coin không hỗ trợ: {arg}\n🪙 Danh sách: {supported}"
+                    )
+                    return
+                coins.append(symbol)
+        
+        sub = await self.db.set_subscription(update.effective_user.id, coins=coins)
+        await update.message.reply_text(format_subscription(sub.to_dict()))
+    
+    async def direction_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Choose LONG, SHORT or both"""
+        choice = context.args[0].upper() if context.args else ''
+        
+        if choice == 'ALL':
+            directions = []
+        elif choice in ('LONG', 'SHORT'):
+            directions = [choice]
+        else:
+            await update.message.reply_text("📌 Cách dùng: /direction LONG, /direction SHORT hoặc /direction ALL")
+            return
+        
+        sub = await self.db.set_subscription(update.effective_user.id, directions=directions)
+        await update.message.reply_text(format_subscription(sub.to_dict()))
+    
+    async def minrr_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Set the minimum RR ratio of received signals"""
+        try:
+            min_rr = float(context.args[0])
+            if min_rr < 0:
+                raise ValueError
+        except (IndexError, ValueError):
+            await update.message.reply_text("📌 Cách dùng: /minrr 2 (hoặc /minrr 0 để bỏ giới hạn)")
+            return
+        
+        sub = await self.db.set_subscription(update.effective_user.id, min_rr=min_rr)
+        await update.message.reply_text(format_subscription(sub.to_dict()))
+    
     async def handle_admin_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle messages from admin to broadcast"""
-        if update.effective_user.id not in self.db.get_all_admins():
+        if not await self.db.is_admin(update.effective_user.id):
             return
         
         # Get message content
         message = update.message
-        users = self.db.get_all_active_users()
-        
-        success_count = 0
-        fail_count = 0
+        users = await self.db.get_all_active_users()
+        report = DeliveryReport('admin')
         
         for user_id in users:
             try:
@@ -135,15 +277,18 @@ class ScalpingBot:
                         chat_id=user_id,
                         text=message.text
                     )
-                success_count += 1
+                report.success()
+            except Forbidden:
+                await self.db.deactivate_user(user_id)
+                report.blocked()
             except Exception as e:
-                logger.error(f"Failed to send to {user_id}: {e}")
-                fail_count += 1
+                report.failure(user_id, e)
             
             await asyncio.sleep(0.05)  # Avoid rate limit
         
+        report.log(logger)
         await update.message.reply_text(
-            f"✅ Đã gửi đến {success_count} người dùng\n❌ Thất bại: {fail_count}"
+            f"✅ Đã gửi đến {report.sent} người dùng\n❌ Thất bại: {report.failed}"
         )
     
     async def handle_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -151,7 +296,7 @@ class ScalpingBot:
         query = update.callback_query
         await query.answer()
         
-        if not self.db.is_admin(query.from_user.id):
+        if not await self.db.is_admin(query.from_user.id):
             await query.edit_message_text("❌ Bạn không có quyền thực hiện thao tác này.")
             return
         
@@ -159,12 +304,12 @@ class ScalpingBot:
         
         if data.startswith("block_"):
             user_id = int(data.split("_")[1])
-            self.db.block_user(user_id)
+            await self.db.block_user(user_id)
             await query.edit_message_text(f"✅ Đã chặn người dùng {user_id}")
         
         elif data.startswith("unblock_"):
             user_id = int(data.split("_")[1])
-            self.db.unblock_user(user_id)
+            await self.db.unblock_user(user_id)
             await query.edit_message_text(f"✅ Đã mở chặn người dùng {user_id}")
         
         elif data.startswith("delete_signal_"):
@@ -175,130 +320,256 @@ class ScalpingBot:
     async def scan_and_send_signals(self, context: ContextTypes.DEFAULT_TYPE):
         """Main scanning function - runs every minute"""
         now = datetime.now()
-        minute = now.minute
         
-        # Check if it's time to scan (1, 16, 31, 46 minutes)
-        scan_minutes = [1, 16, 31, 46]
-        
-        if minute in scan_minutes and self.is_scanning:
-            logger.info(f"Starting coin scan at {now.strftime('%H:%M:%S')}")
+        # Check if it's time to scan (1, 16, 31, 46 minutes), once per slot
+        slot = scan_slot(now)
+        if (self.scan_planner.is_scan_time(now) and self.is_scanning
+                and self.last_runs.get('scan') != slot):
+            self.last_runs['scan'] = slot
             
-            for coin in TOP_COINS:
-                try:
-                    # Skip if coin was analyzed in last 2 hours
-                    if self.signal_manager.was_recently_analyzed(coin):
-                        continue
-                    
-                    # Analyze coin
-                    analysis = await self.analyzer.analyze_coin(coin)
-                    
-                    # Check if confidence is 100%
-                    if analysis['confidence'] == 100:
-                        # Get signal number for today
-                        signal_number = self.db.get_today_signal_count() + 1
-                        
-                        # Save signal to database
-                        signal_id = self.db.add_signal(
-                            coin=coin,
-                            direction=analysis['direction'],
-                            entry=analysis['entry'],
-                            stop_loss=analysis['stop_loss'],
-                            take_profits=analysis['take_profits'],
-                            rr_ratio=analysis['rr_ratio']
-                        )
-                        
-                        # Format and send signal to all users
-                        signal_msg = format_signal_message(
-                            signal_number=signal_number,
-                            coin=coin,
-                            direction=analysis['direction'],
-                            entry=analysis['entry'],
-                            take_profits=analysis['take_profits'],
-                            stop_loss=analysis['stop_loss'],
-                            rr_ratio=analysis['rr_ratio'],
-                            sent_by="AI Bot"
-                        )
-                        
-                        # Send to all active users
-                        await self.broadcast_message(context, signal_msg)
-                        
-                        # Mark coin as analyzed
-                        self.signal_manager.mark_as_analyzed(coin)
-                        
-                        logger.info(f"Signal sent for {coin} - Signal #{signal_number}")
+            with log_context(scan_id=slot):
+                logger.info("Starting coin scan at %s", now.strftime('%H:%M:%S'))
+                
+                await self.update_regime()
                 
+                # Most promising coins first, within the cycle's time budget;
+                # coins analyzed in the last 2 hours are left out of the plan.
+                # Each candidate is sent as soon as it is found, while the scan goes on
+                await self.scan_planner.run_scan(
+                    self.analyzer.analyze_coin,
+                    self.analyzer.priority_scores(self.scan_planner.coins),
+                    on_candidate=lambda analysis: self.start_send(context, [analysis], slot)
+                )
+    
+    async def scan(self, context: ContextTypes.DEFAULT_TYPE):
+        """One scheduler tick of scan_and_send_signals, run as a background task"""
+        try:
+            await self.scan_and_send_signals(context)
+        except Exception as e:
+            logger.error("Error scanning coins: %s", e)
+        finally:
+            self.scan_task = None
+    
+    async def process_coin(self, coin: str, reasons: List[str]):
+        """Analyze one coin right away, when the live feed shows it moving"""
+        if not self.is_scanning:
+            return
+        
+        with log_context(scan_id=f"trigger-{coin}"):
+            logger.info("%s: triggered by %s", coin, ', '.join(reasons))
+            analysis = await self.analyzer.analyze_coin(coin)
+            if analysis['confidence'] >= MIN_CONFIDENCE:
+                await self.send_candidates(self.app, [analysis])
+    
+    async def process_cluster_candidates(self, candidates: List[Dict]):
+        """Candidates of one scan slot, reported by the shard workers"""
+        if not self.is_scanning:
+            return
+        
+        await self.update_regime()
+        await self.send_candidates(self.app, candidates)
+    
+    def start_send(self, context: ContextTypes.DEFAULT_TYPE, candidates: List[Dict], slot: str):
+        """send_candidates in the background, so a broadcast does not hold up the scan"""
+        task = asyncio.create_task(self.send_candidates(context, candidates, slot))
+        self.send_tasks.add(task)
+        task.add_done_callback(self.send_tasks.discard)
+    
+    async def send_candidates(self, context: ContextTypes.DEFAULT_TYPE, candidates: List[Dict],
+                              slot: str = None):
+        """Send the candidates that pass the correlation filter"""
+        if slot is None:
+            slot = scan_slot(self.scan_planner.cycle_start())
+        
+        async with self.send_lock:
+            # One signal per group of highly correlated same-direction coins,
+            # counting the signals already sent in this scan cycle
+            for analysis in self.regime.admit(candidates, slot):
+                # A coin can be reported twice while shards move between workers,
+                # or by a trigger and a scan
+                if await self.db.was_recently_analyzed(analysis['symbol']):
+                    logger.info("%s: skipped - signal already sent this cooldown", analysis['symbol'])
+                    continue
+                
+                try:
+                    await self.send_signal(context, analysis)
                 except Exception as e:
-                    logger.error(f"Error analyzing {coin}: {e}")
+                    logger.error("Error sending signal for %s: %s", analysis['symbol'], e)
+                    continue
+                self.regime.record_sent(analysis, slot)
                 
-                await asyncio.sleep(2)  # Small delay between coins
+                if self.coordinator:
+                    await self.coordinator.publish_cooldown(analysis['symbol'])
+    
+    async def update_regime(self):
+        """Refresh the cross-coin correlation matrix from the shared candle buffers"""
+        try:
+            candles = {}
+            for coin in TOP_COINS:
+                candles[coin] = await self.analyzer.get_candles(coin, REGIME_INTERVAL, self.regime_limit)
+            self.regime.update(candles)
+        except Exception as e:
+            logger.error("Error updating market regime: %s", e)
+    
+    async def send_signal(self, context: ContextTypes.DEFAULT_TYPE, analysis: Dict):
+        """Store a signal and send it to its audience"""
+        coin = analysis['symbol']
+        
+        # Save signal to database (numbered atomically per day)
+        signal_id, signal_number = await self.db.add_signal(
+            coin=coin,
+            direction=analysis['direction'],
+            entry=analysis['entry'],
+            stop_loss=analysis['stop_loss'],
+            take_profits=analysis['take_profits'],
+            rr_ratio=analysis['rr_ratio']
+        )
+        
+        with log_context(signal_id=signal_id):
+            # Rendered in a worker thread while the writes and audience query run
+            chart_task = asyncio.create_task(self.render_chart(signal_id, analysis)) if SIGNAL_CHARTS else None
+            
+            # Format and send signal to all users
+            signal_msg = format_signal_message(
+                signal_number=signal_number,
+                coin=coin,
+                direction=analysis['direction'],
+                entry=analysis['entry'],
+                take_profits=analysis['take_profits'],
+                stop_loss=analysis['stop_loss'],
+                rr_ratio=analysis['rr_ratio'],
+                sent_by="AI Bot"
+            )
+            
+            # Mark coin as analyzed and make every buffered write durable first
+            await self.signal_manager.mark_as_analyzed(coin)
+            await self.db.flush_writes()
+            
+            # Send to users subscribed to this coin and direction
+            audience = await self.db.get_signal_audience(
+                coin, analysis['direction'], analysis['rr_ratio']
+            )
+            chart = await chart_task if chart_task else None
+            if chart:
+                await self.broadcast_photo(context, chart, signal_msg, audience, name='signal')
+            else:
+                await self.broadcast_message(context, signal_msg, audience, name='signal')
+            
+            logger.info("Signal sent for %s - Signal #%s", coin, signal_number)
+    
+    async def render_chart(self, signal_id: int, analysis: Dict) -> Optional[Dict]:
+        """Chart of a signal from the buffered candles; None if it cannot be drawn"""
+        try:
+            # Same limit as the analysis timeframe, so the candle buffer is reused
+            limit = max(CHART_CANDLES, TIMEFRAMES.get(CHART_INTERVAL, {}).get('limit', 0))
+            candles = await self.analyzer.get_candles(analysis['symbol'], CHART_INTERVAL, limit)
+            if not candles:
+                return None
+            return await self.charts.render(signal_id, analysis, candles[-CHART_CANDLES:])
+        except Exception as e:
+            logger.error("Error rendering chart for %s: %s", analysis['symbol'], e)
+            return None
     
     async def monitor_active_signals(self, context: ContextTypes.DEFAULT_TYPE):
-        """Monitor active signals every 5 minutes"""
-        active_signals = self.db.get_active_signals()
+        """Resolve TP/SL hits of active signals from candles closed since the last check"""
+        active_signals = await self.db.get_active_signals()
+        self.signal_manager.triggers.retain([signal['id'] for signal in active_signals])
         
+        # One candle request per coin covers every active signal on it
+        signals_by_coin = {}
         for signal in active_signals:
+            signals_by_coin.setdefault(signal['coin'], []).append(signal)
+        
+        for coin, signals in signals_by_coin.items():
             try:
-                coin = signal['coin']
-                current_price = await self.analyzer.get_current_price(coin)
+                start_time = min(self.signal_manager.checked_from(signal) for signal in signals)
+                candles = await self.analyzer.get_closed_klines(coin, INTRABAR_INTERVAL, start_time)
+                if not candles:
+                    continue
                 
-                # Check if TP hit
-                tp_hit = self.signal_manager.check_take_profit(
-                    signal, 
-                    current_price
-                )
+                checked_until = candles[-1]['close_time']
+                outcomes = self.signal_manager.resolve_candles(coin, signals, candles)
+                adverse = self.signal_manager.adverse_moves(signals, candles, outcomes)
                 
-                if tp_hit:
-                    profit_percent = self.signal_manager.calculate_profit(
-                        signal['entry'],
-                        current_price,
-                        signal['direction']
-                    )
-                    
-                    # Update database
-                    self.db.update_signal_status(signal['id'], 'completed', profit_percent)
-                    
-                    # Send TP notification
-                    tp_msg = format_tp_message(
-                        signal_number=signal['signal_number'],
-                        coin=coin,
-                        profit_percent=profit_percent
-                    )
-                    
-                    await self.broadcast_message(context, tp_msg)
-                    
-                    logger.info(f"TP hit for {coin} - Profit: {profit_percent:.2f}%")
-                
-                # Check if SL hit
-                elif self.signal_manager.check_stop_loss(signal, current_price):
-                    loss_percent = self.signal_manager.calculate_profit(
-                        signal['entry'],
-                        current_price,
-                        signal['direction']
-                    )
-                    
-                    # Update database
-                    self.db.update_signal_status(signal['id'], 'stopped', loss_percent)
-                    
-                    logger.info(f"SL hit for {coin} - Loss: {loss_percent:.2f}%")
+                for signal in signals:
+                    signal['max_adverse'] = max(signal['max_adverse'], adverse.get(signal['id'], 0.0))
+                    outcome = outcomes.get(signal['id'])
+                    if outcome is None:
+                        # A signal sent after the last closed candle keeps its own start,
+                        # or its next check would begin before it was sent
+                        watermark = max(checked_until, self.signal_manager.checked_from(signal) - 1)
+                        await self.db.mark_signal_checked(signal['id'], watermark, signal['max_adverse'])
+                    else:
+                        with log_context(signal_id=signal['id']):
+                            await self.close_signal(context, signal, outcome)
             
             except Exception as e:
-                logger.error(f"Error monitoring signal {signal['id']}: {e}")
+                logger.error("Error monitoring %s signals: %s", coin, e)
+    
+    async def close_signal(self, context: ContextTypes.DEFAULT_TYPE, signal: Dict, outcome: Dict):
+        """Record a TP/SL outcome and notify the signal's audience on TP"""
+        coin = signal['coin']
+        profit_percent = self.signal_manager.calculate_profit(
+            signal['entry'],
+            outcome['exit_price'],
+            signal['direction']
+        )
+        
+        # Update database (and the performance rollups)
+        await self.db.update_signal_status(signal['id'], outcome['status'], profit_percent,
+                                           signal.get('max_adverse', 0.0))
+        
+        if outcome['status'] == 'completed':
+            # Make the close durable first, so a crash cannot resend the TP after a restart
+            await self.db.flush_writes()
+            
+            # Send TP notification
+            tp_msg = format_tp_message(
+                signal_number=signal['signal_number'],
+                coin=coin,
+                profit_percent=profit_percent
+            )
+            
+            audience = await self.db.get_signal_audience(
+                coin, signal['direction'], signal['rr_ratio']
+            )
+            await self.broadcast_message(context, tp_msg, audience, name='tp')
+            
+            logger.info("TP%s hit for %s - Profit: %.2f%%", outcome['tp_level'], coin, profit_percent)
+        else:
+            logger.info("SL hit for %s - Loss: %.2f%%", coin, profit_percent)
     
     async def send_daily_summary(self, context: ContextTypes.DEFAULT_TYPE):
         """Send daily summary at 11 PM"""
         now = datetime.now()
         
-        if now.hour == 23 and now.minute == 0:
-            stats = self.db.get_daily_stats()
-            summary_msg = format_daily_summary(stats)
+        today = now.date().isoformat()
+        
+        if now.hour == 23 and now.minute == 0 and self.last_runs.get('daily_summary') != today:
+            self.last_runs['daily_summary'] = today
+            await self.db.flush_writes()
+            stats = await self.db.get_daily_stats()
             
-            await self.broadcast_message(context, summary_msg)
+            # Week and month to date, one rollup row each
+            to_date = {}
+            for period in ('week', 'month'):
+                rows = await self.db.get_performance(period, count=1)
+                if rows and rows[0]['period_start'] == period_start(period, now.date()):
+                    to_date[period] = rows[0]
+            
+            summary_msg = format_daily_summary(stats, to_date.get('week'), to_date.get('month'))
+            
+            await self.broadcast_message(context, summary_msg, name='daily_summary')
             logger.info("Daily summary sent")
     
-    async def broadcast_message(self, context: ContextTypes.DEFAULT_TYPE, message: str):
-        """Broadcast message to all active users"""
-        users = self.db.get_all_active_users()
+    async def broadcast_message(self, context: ContextTypes.DEFAULT_TYPE, message: str,
+                                users: List[int] = None, name: str = 'message'):
+        """Broadcast message to the given users (all active users by default)"""
+        if users is None:
+            users = await self.db.get_all_active_users()
         
+        # Failures are summarized in one record instead of a line per user
+        report = DeliveryReport(name)
         for user_id in users:
             try:
                 await context.bot.send_message(
@@ -306,16 +577,103 @@ class ScalpingBot:
                     text=message,
                     parse_mode='HTML'
                 )
+                report.success()
+                await asyncio.sleep(0.05)
+            except Forbidden:
+                # User blocked the bot; stop sending until they /start again
+                await self.db.deactivate_user(user_id)
+                report.blocked()
+            except Exception as e:
+                report.failure(user_id, e)
+        
+        report.log(logger)
+    
+    async def broadcast_photo(self, context: ContextTypes.DEFAULT_TYPE, chart: Dict, caption: str,
+                              users: List[int], name: str = 'photo'):
+        """Send a chart to the given users, uploading it only once.
+        
+        The image goes up with the first successful send; every other
+        recipient gets the file_id Telegram returned for it.
+        """
+        report = DeliveryReport(name)
+        for user_id in users:
+            try:
+                message = await context.bot.send_photo(
+                    chat_id=user_id,
+                    photo=chart['file_id'] or chart['png'],
+                    caption=caption,
+                    parse_mode='HTML'
+                )
+                if chart['file_id'] is None:
+                    chart['file_id'] = message.photo[-1].file_id
+                report.success()
                 await asyncio.sleep(0.05)
+            except Forbidden:
+                await self.db.deactivate_user(user_id)
+                report.blocked()
             except Exception as e:
-                logger.error(f"Failed to send to {user_id}: {e}")
+                report.failure(user_id, e)
+        
+        report.log(logger)
+    
+    async def run_daily_retention(self):
+        """Archive old signals and prune inactive users once a day"""
+        now = datetime.now()
+        
+        today = now.date().isoformat()
+        
+        if now.hour == RETENTION_HOUR and now.minute == 0 and self.last_runs.get('retention') != today:
+            self.last_runs['retention'] = today
+            await self.db.run_retention()
+    
+    async def retention_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Run retention on demand (admin only)"""
+        if not await self.db.is_admin(update.effective_user.id):
+            return
+        
+        result = await self.db.run_retention()
+        
+        await update.message.reply_text(
+            f"🧹 Dọn dẹp dữ liệu:\n"
+            f"📦 Tín hiệu đã lưu trữ: {result['archived_signals']}\n"
+            f"👤 Người dùng đã xóa: {result['pruned_users']}\n"
+            f"💾 Trang đã giải phóng: {result['vacuumed_pages']}"
+        )
+    
+    async def report_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """/report [day|week|month] [COIN] [LONG|SHORT] [n] - performance from the rollups (admin only)"""
+        if not await self.db.is_admin(update.effective_user.id):
+            return
+        
+        period, coin, direction, count = 'week', '*', '*', 4
+        for arg in (a.upper() for a in context.args):
+            if arg.lower() in PERIOD_LABELS:
+                period = arg.lower()
+            elif arg in ('LONG', 'SHORT'):
+                direction = arg
+            elif arg.isdigit():
+                count = min(int(arg), 24)
+            else:
+                symbol = arg if arg.endswith('USDT') else f"{arg}USDT"
+                if not validate_symbol(symbol):
+                    await update.message.reply_text(
+                        "❌ Cú pháp: /report [day|week|month] [COIN] [LONG|SHORT] [số kỳ]"
+                    )
+                    return
+                coin = symbol
+        
+        rows = await self.db.get_performance(period, coin, direction, count)
+        await update.message.reply_text(format_performance_report(period, coin, direction, rows))
     
     async def scheduled_tasks(self, context: ContextTypes.DEFAULT_TYPE):
         """Run all scheduled tasks"""
         while True:
             try:
-                # Scan for signals (every minute, but only scans at specific minutes)
-                await self.scan_and_send_signals(context)
+                # Scan for signals (every minute, but only scans at specific minutes);
+                # in the background, so a long scan does not hold up the monitor
+                # ticks and the daily summary
+                if not self.coordinator and not self.scan_task:
+                    self.scan_task = asyncio.create_task(self.scan(context))
                 
                 # Monitor active signals (every 5 minutes)
                 if datetime.now().minute % 5 == 0:
@@ -324,38 +682,204 @@ class ScalpingBot:
                 # Send daily summary
                 await self.send_daily_summary(context)
                 
+                # Archive and compact once a day
+                await self.run_daily_retention()
+                
             except Exception as e:
-                logger.error(f"Error in scheduled tasks: {e}")
+                logger.error("Error in scheduled tasks: %s", e)
             
             # Wait 60 seconds before next check
             await asyncio.sleep(60)
     
-    def run(self):
-        """Run the bot"""
-        # Add handlers
+    async def on_startup(self, application: Application):
+        """Start background services once the application is initialized"""
+        self.db.start()
+        
+        # A second notifier on the same database would send every signal twice;
+        # after a crash the old lease expires within NOTIFIER_LEASE_TTL
+        while not await self.db.acquire_lease('notifier', self.lease_holder, NOTIFIER_LEASE_TTL):
+            logger.warning("Another notifier holds the lease - waiting for it to expire")
+            await asyncio.sleep(NOTIFIER_LEASE_TTL / 3)
+        self.lease_task = asyncio.create_task(self.lease_loop())
+        
+        await self.restore_snapshot()
+        self.snapshot_task = asyncio.create_task(self.snapshot_loop())
+        
+        if self.coordinator:
+            await self.coordinator.start()
+        
+        if self.triggers:
+            self.trigger_task = asyncio.create_task(self.triggers.run())
+    
+    async def on_shutdown(self, application: Application):
+        """Release resources after the application stops"""
+        if self.scan_task:
+            self.scan_task.cancel()
+            self.scan_task = None
+        
+        # Let signals found by the last scan finish sending
+        if self.send_tasks:
+            await asyncio.gather(*self.send_tasks, return_exceptions=True)
+        
+        if self.backfill_task:
+            self.backfill_task.cancel()
+            self.backfill_task = None
+        
+        if self.snapshot_task:
+            self.snapshot_task.cancel()
+            self.snapshot_task = None
+        await self.save_snapshot()
+        
+        if self.coordinator:
+            await self.coordinator.stop()
+        
+        if self.trigger_task:
+            self.trigger_task.cancel()
+            self.trigger_task = None
+            await self.triggers.stop()
+        
+        if self.lease_task:
+            self.lease_task.cancel()
+            self.lease_task = None
+            await self.db.release_lease('notifier', self.lease_holder)
+        
+        await self.analyzer.close_session()
+        await self.db.close()
+    
+    async def lease_loop(self):
+        """Renew the notifier lease; stop the bot if another process took it over"""
+        while True:
+            await asyncio.sleep(NOTIFIER_LEASE_TTL / 3)
+            try:
+                renewed = await self.db.acquire_lease('notifier', self.lease_holder, NOTIFIER_LEASE_TTL)
+            except Exception as e:
+                logger.error("Error renewing notifier lease: %s", e)
+                continue
+            
+            if not renewed:
+                logger.critical("Notifier lease lost - stopping")
+                self.is_scanning = False
+                self.lease_task = None
+                self.stop()
+                return
+    
+    def stop(self):
+        """Stop serving, in either delivery mode"""
+        if self.stop_event:
+            self.stop_event.set()
+        else:
+            self.app.stop_running()
+    
+    async def restore_snapshot(self):
+        """Warm start: restore candle buffers and scheduler state, then backfill the gap"""
+        loop = asyncio.get_running_loop()
+        state = await loop.run_in_executor(None, self.snapshots.load)
+        if not state:
+            return
+        
+        self.analyzer.import_state(state.get('analyzer', {}))
+        self.last_runs.update(state.get('last_runs', {}))
+        # Coin cooldowns are already warm: they are loaded from analyzed_coins
+        self.backfill_task = asyncio.create_task(self.backfill())
+    
+    async def backfill(self):
+        """Catch the restored candle buffers up in the background"""
+        try:
+            await self.analyzer.backfill()
+            logger.info("Candle buffers backfilled")
+        except Exception as e:
+            logger.error("Error backfilling candle buffers: %s", e)
+        finally:
+            self.backfill_task = None
+    
+    async def save_snapshot(self):
+        """Write a runtime snapshot; serialization and I/O run off the event loop"""
+        state = {
+            'analyzer': self.analyzer.export_state(),
+            'last_runs': dict(self.last_runs)
+        }
+        
+        try:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self.snapshots.save, state)
+        except Exception as e:
+            logger.error("Error saving snapshot: %s", e)
+    
+    async def snapshot_loop(self):
+        while True:
+            await asyncio.sleep(SNAPSHOT_INTERVAL)
+            await self.save_snapshot()
+    
+    def register_handlers(self):
+        """Register command, callback and admin message handlers"""
         self.app.add_handler(CommandHandler("start", self.start))
         self.app.add_handler(CommandHandler("stats", self.stats))
         self.app.add_handler(CommandHandler("help", self.help_command))
+        self.app.add_handler(CommandHandler("subscription", self.subscription_command))
+        self.app.add_handler(CommandHandler("coins", self.coins_command))
+        self.app.add_handler(CommandHandler("direction", self.direction_command))
+        self.app.add_handler(CommandHandler("minrr", self.minrr_command))
+        self.app.add_handler(CommandHandler("retention", self.retention_command))
+        self.app.add_handler(CommandHandler("report", self.report_command))
         self.app.add_handler(CallbackQueryHandler(self.handle_callback))
+        
+        # Admin set is read from the roster on every message, so add_admin applies immediately
+        admin_filter = AdminFilter(self.db.roster)
         self.app.add_handler(
             MessageHandler(
-                filters.TEXT & filters.User(user_id=self.db.get_all_admins()),
+                filters.TEXT & admin_filter,
                 self.handle_admin_message
             )
         )
         self.app.add_handler(
             MessageHandler(
-                filters.PHOTO & filters.User(user_id=self.db.get_all_admins()),
+                filters.PHOTO & admin_filter,
                 self.handle_admin_message
             )
         )
+    
+    async def run_webhook(self):
+        """Serve updates through the embedded webhook server"""
+        self.stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (SIGINT, SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.stop_event.set)
+            except NotImplementedError:
+                pass
+        
+        async with self.app:
+            await self.on_startup(self.app)
+            await self.app.start()
+            await self.webhook_server.start()
+            
+            logger.info("Bot started successfully (webhook mode)!")
+            try:
+                await self.stop_event.wait()
+            finally:
+                await self.webhook_server.stop()
+                await self.app.stop()
+        
+        # post_init/post_shutdown only run from run_polling/run_webhook
+        await self.on_shutdown(self.app)
+    
+    def run(self):
+        """Run the bot"""
+        self.register_handlers()
         
         # Start scheduled tasks
         self.app.job_queue.run_once(self.scheduled_tasks, 0)
         
+        if DELIVERY_MODE == "webhook":
+            asyncio.run(self.run_webhook())
+            return
+        
         logger.info("Bot started successfully!")
         self.app.run_polling(allowed_updates=Update.ALL_TYPES)
 
 if __name__ == "__main__":
-    bot = ScalpingBot()
-    bot.run()
+    if CLUSTER_ROLE == "worker":
+        asyncio.run(run_worker())
+    else:
+        bot = ScalpingBot()
+        bot.run()
@@ -0,0 +1,103 @@
+# chart.py - Signal Chart Rendering
+import asyncio
+import io
+from typing import Dict, List
+
+from PIL import Image, ImageDraw, ImageFont
+
+from config import CHART_WIDTH, CHART_HEIGHT, CHART_CACHE_SIZE
+from analysis_cache import LRUCache
+
+BACKGROUND = (19, 23, 34)
+GRID = (42, 46, 57)
+UP = (38, 166, 154)
+DOWN = (239, 83, 80)
+ENTRY = (41, 98, 255)
+STOP_LOSS = (239, 83, 80)
+TAKE_PROFIT = (38, 166, 154)
+
+MARGIN_TOP = 36
+MARGIN_BOTTOM = 16
+MARGIN_LEFT = 10
+LABEL_WIDTH = 120
+
+def render_signal_chart(candles: List[Dict], direction: str, entry: float, stop_loss: float,
+                        take_profits: List[float], title: str,
+                        width: int = CHART_WIDTH, height: int = CHART_HEIGHT) -> bytes:
+    """PNG of the candles with entry, SL and TP levels; pure CPU, meant for an executor"""
+    image = Image.new('RGB', (width, height), BACKGROUND)
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default()
+
+    levels = [('Entry', entry, ENTRY), ('SL', stop_loss, STOP_LOSS)]
+    levels += [(f'TP{i}', tp, TAKE_PROFIT) for i, tp in enumerate(take_profits, 1)]
+
+    # Price range covering the candles and every level
+    low = min([c['low'] for c in candles] + [price for _, price, _ in levels])
+    high = max([c['high'] for c in candles] + [price for _, price, _ in levels])
+    padding = (high - low) * 0.05 or high * 0.01
+    low, high = low - padding, high + padding
+
+    plot_right = width - LABEL_WIDTH
+    plot_height = height - MARGIN_TOP - MARGIN_BOTTOM
+
+    def y(price: float) -> float:
+        return MARGIN_TOP + (high - price) / (high - low) * plot_height
+
+    # Grid
+    for i in range(5):
+        grid_y = MARGIN_TOP + plot_height * i / 4
+        draw.line([(MARGIN_LEFT, grid_y), (plot_right, grid_y)], fill=GRID)
+
+    # Trade zones: entry to SL, entry to last TP
+    zone_left = plot_right - (plot_right - MARGIN_LEFT) * 0.25
+    draw.rectangle([zone_left, min(y(entry), y(stop_loss)), plot_right, max(y(entry), y(stop_loss))],
+                   fill=(60, 30, 34))
+    draw.rectangle([zone_left, min(y(entry), y(take_profits[-1])), plot_right,
+                    max(y(entry), y(take_profits[-1]))], fill=(24, 56, 54))
+
+    # Candles
+    step = (zone_left - MARGIN_LEFT) / max(len(candles), 1)
+    body_width = max(1.0, step * 0.6)
+    for i, candle in enumerate(candles):
+        x = MARGIN_LEFT + step * (i + 0.5)
+        color = UP if candle['close'] >= candle['open'] else DOWN
+        draw.line([(x, y(candle['high'])), (x, y(candle['low']))], fill=color)
+        top, bottom = y(max(candle['open'], candle['close'])), y(min(candle['open'], candle['close']))
+        draw.rectangle([x - body_width / 2, top, x + body_width / 2, max(bottom, top + 1)], fill=color)
+
+    # Levels with labels in the right margin
+    for name, price, color in levels:
+        level_y = y(price)
+        draw.line([(MARGIN_LEFT, level_y), (plot_right, level_y)], fill=color, width=1)
+        draw.text((plot_right + 6, level_y - 6), f"{name} {price:.4f}", fill=color, font=font)
+
+    draw.text((MARGIN_LEFT, 10), f"{title}  {direction}", fill=UP if direction == 'LONG' else DOWN, font=font)
+
+    output = io.BytesIO()
+    image.save(output, format='PNG', optimize=True)
+    return output.getvalue()
+
+class SignalCharts:
+    """Chart of each signal, rendered once and then sent by Telegram file_id.
+
+    The PNG is uploaded to the first recipient only; the ``file_id`` Telegram
+    returns is stored next to it and reused for every later send.
+    """
+
+    def __init__(self, max_size: int = CHART_CACHE_SIZE):
+        self.cache = LRUCache(max_size)
+
+    async def render(self, signal_id: int, analysis: Dict, candles: List[Dict]) -> Dict:
+        """Cached chart entry of a signal ({'png', 'file_id'}), rendered off the event loop"""
+        entry = self.cache.get(signal_id)
+        if entry is None:
+            loop = asyncio.get_running_loop()
+            png = await loop.run_in_executor(
+                None, render_signal_chart, candles, analysis['direction'], analysis['entry'],
+                analysis['stop_loss'], analysis['take_profits'], analysis['symbol']
+            )
+            entry = {'png': png, 'file_id': None}
+            self.cache.put(signal_id, entry)
+        return entry
+
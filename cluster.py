@@ -0,0 +1,390 @@
+# cluster.py - Sharded Scanning across Worker Processes
+#
+# One notifier process owns the database and Telegram and runs the
+# ShardCoordinator; any number of ShardWorker processes (same or other
+# hosts) analyze the coins assigned to them and report candidates back.
+# Messages are JSON objects, one per line, over TCP.
+import asyncio
+import hashlib
+import hmac
+import ipaddress
+import json
+import logging
+import math
+import os
+import socket
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List
+
+from config import (
+    TOP_COINS, CLUSTER_HOST, CLUSTER_PORT, CLUSTER_TOKEN, WORKER_ID,
+    HEARTBEAT_INTERVAL, WORKER_TIMEOUT, SCAN_REPORT_TIMEOUT, MIN_CONFIDENCE,
+    EVENT_TRIGGERS, RECORD_MODE
+)
+from analyzer import CryptoAnalyzer
+from event_triggers import TriggerWatcher
+from logging_setup import log_context
+from scan_planner import CooldownTracker, ScanPlanner
+
+logger = logging.getLogger(__name__)
+
+def assign_shards(coins: List[str], workers: List[str]) -> Dict[str, List[str]]:
+    """Rendezvous hashing: each coin goes to the worker with the highest hash,
+    so a worker joining or leaving only moves its own share of coins"""
+    shards = {worker: [] for worker in workers}
+    if not workers:
+        return shards
+
+    for coin in coins:
+        owner = max(workers, key=lambda worker: hashlib.md5(f"{worker}:{coin}".encode()).digest())
+        shards[owner].append(coin)
+    return shards
+
+async def send_message(writer: asyncio.StreamWriter, message: Dict):
+    writer.write(json.dumps(message, separators=(',', ':')).encode() + b'\n')
+    await writer.drain()
+
+def is_loopback(host: str) -> bool:
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+def valid_candidate(candidate, coins: List[str]) -> bool:
+    """Whether a reported candidate has the shape of an analyze_coin signal on a known coin"""
+    def price(value) -> bool:
+        return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value) and value > 0
+
+    if not isinstance(candidate, dict):
+        return False
+    take_profits = candidate.get('take_profits')
+    return (
+        candidate.get('symbol') in coins
+        and candidate.get('direction') in ('LONG', 'SHORT')
+        and price(candidate.get('entry'))
+        and price(candidate.get('stop_loss'))
+        and price(candidate.get('rr_ratio'))
+        and price(candidate.get('confidence')) and candidate['confidence'] >= MIN_CONFIDENCE
+        and isinstance(take_profits, list) and len(take_profits) == 4
+        and all(price(tp) for tp in take_profits)
+    )
+
+def scan_slot(now: datetime) -> str:
+    """Identifier of a scan cycle, shared by every process"""
+    return now.strftime('%Y-%m-%d %H:%M')
+
+class _WorkerLink:
+    """Coordinator-side state of one connected worker"""
+
+    def __init__(self, worker_id: str, writer: asyncio.StreamWriter):
+        self.worker_id = worker_id
+        self.writer = writer
+        self.coins: List[str] = []
+        self.last_seen = time.monotonic()
+
+class ShardCoordinator:
+    """Assigns coin shards to connected workers and collects their candidates.
+
+    Runs inside the notifier. Shards are recomputed whenever a worker joins,
+    disconnects or misses heartbeats for WORKER_TIMEOUT. The candidates of a
+    scan slot are handed to ``on_candidates`` together, once every live worker
+    has reported (or SCAN_REPORT_TIMEOUT passed), so the correlation filter
+    sees the whole universe.
+    """
+
+    def __init__(self, on_candidates: Callable[[List[Dict]], Awaitable[None]],
+                 cooldowns: CooldownTracker, coins: List[str] = TOP_COINS,
+                 host: str = CLUSTER_HOST, port: int = CLUSTER_PORT, token: str = CLUSTER_TOKEN):
+        self.on_candidates = on_candidates
+        self.cooldowns = cooldowns
+        self.coins = list(coins)
+        self.host = host
+        self.port = port
+        self.token = token
+        self.workers: Dict[str, _WorkerLink] = {}
+        self.reports: Dict[str, Dict] = {}
+        self.coverage: Dict = {}
+        self.server = None
+        self._reaper = None
+        self._deliveries = set()
+
+    async def start(self):
+        # Reported candidates are broadcast as signals, so peers must authenticate
+        if not self.token and not is_loopback(self.host):
+            raise RuntimeError(f"CLUSTER_TOKEN must be set to listen on {self.host}")
+
+        self.server = await asyncio.start_server(self.handle_worker, self.host, self.port)
+        self._reaper = asyncio.create_task(self.reap_loop())
+        logger.info("Shard coordinator listening on %s:%s", self.host, self.port)
+
+    async def stop(self):
+        if self._reaper:
+            self._reaper.cancel()
+            self._reaper = None
+        if self.server:
+            self.server.close()
+            for link in list(self.workers.values()):
+                link.writer.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    async def handle_worker(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        link = None
+        try:
+            hello = json.loads(await reader.readline() or b'{}')
+            if hello.get('type') != 'hello' or not hmac.compare_digest(str(hello.get('token', '')), self.token):
+                logger.warning("Rejected worker connection from %s", writer.get_extra_info('peername'))
+                return
+
+            previous = self.workers.get(hello['worker'])
+            if previous:
+                previous.writer.close()
+            link = _WorkerLink(hello['worker'], writer)
+            self.workers[link.worker_id] = link
+            logger.info("Worker %s joined (%d workers)", link.worker_id, len(self.workers))
+            await self.rebalance()
+
+            async for line in reader:
+                link.last_seen = time.monotonic()
+                message = json.loads(line)
+                if message['type'] == 'report':
+                    await self.on_report(link.worker_id, message['slot'],
+                                         self.checked(link.worker_id, message['candidates']),
+                                         message.get('coverage', {}))
+                elif message['type'] == 'trigger':
+                    # Out-of-cycle analysis of one coin: nothing to wait for
+                    candidates = self.checked(link.worker_id, message['candidates'])
+                    if candidates:
+                        self.start_delivery(f"trigger-{candidates[0]['symbol']}", candidates)
+
+        except (ConnectionError, ValueError, KeyError) as e:
+            logger.warning("Worker connection error: %s", e)
+        finally:
+            writer.close()
+            if link and self.workers.get(link.worker_id) is link:
+                del self.workers[link.worker_id]
+                logger.warning("Worker %s left (%d workers)", link.worker_id, len(self.workers))
+                await self.rebalance()
+
+    def checked(self, worker_id: str, candidates) -> List[Dict]:
+        """Candidates of a worker message that are well-formed signals; the rest are dropped"""
+        if not isinstance(candidates, list):
+            candidates = [candidates]
+        valid = [candidate for candidate in candidates if valid_candidate(candidate, self.coins)]
+        if len(valid) < len(candidates):
+            logger.warning("Dropped %d malformed candidates from worker %s",
+                           len(candidates) - len(valid), worker_id)
+        return valid
+
+    async def rebalance(self):
+        """Send every worker whose shard changed its new coin list"""
+        shards = assign_shards(self.coins, sorted(self.workers))
+        cooldowns = self.cooldowns.snapshot()
+
+        for worker_id, coins in shards.items():
+            link = self.workers[worker_id]
+            if coins == link.coins:
+                continue
+            link.coins = coins
+            try:
+                await send_message(link.writer, {'type': 'assign', 'coins': coins, 'cooldowns': cooldowns})
+            except ConnectionError:
+                link.writer.close()  # handle_worker drops it and rebalances again
+
+        if not self.workers:
+            logger.warning("No workers connected - no coins are being scanned")
+
+        # A slot may now be complete without the workers that left
+        for slot in list(self.reports):
+            await self.flush_if_complete(slot)
+
+    async def publish_cooldown(self, coin: str):
+        """Tell workers a coin's cooldown started, so they skip it too"""
+        analyzed_at = self.cooldowns.snapshot().get(coin)
+        if analyzed_at is None:
+            return
+
+        for link in list(self.workers.values()):
+            try:
+                await send_message(link.writer, {'type': 'cooldown', 'coin': coin, 'analyzed_at': analyzed_at})
+            except ConnectionError:
+                link.writer.close()
+
+    async def on_report(self, worker_id: str, slot: str, candidates: List[Dict], coverage: Dict = None):
+        report = self.reports.setdefault(slot, {
+            'workers': set(), 'candidates': [], 'opened': time.monotonic(),
+            'coverage': {'analyzed': 0, 'eligible': 0, 'carried': 0}
+        })
+        report['workers'].add(worker_id)
+        report['candidates'].extend(candidates)
+        for field in report['coverage']:
+            report['coverage'][field] += (coverage or {}).get(field, 0)
+        await self.flush_if_complete(slot)
+
+    async def flush_if_complete(self, slot: str):
+        report = self.reports.get(slot)
+        if report and report['workers'] >= set(self.workers):
+            await self.flush(slot)
+
+    async def flush(self, slot: str):
+        report = self.reports.pop(slot)
+        self.coverage = report['coverage']
+        logger.info("Scan %s: %d candidates from %d workers, coverage %s",
+                    slot, len(report['candidates']), len(report['workers']), self.coverage,
+                    extra={'data': {'coverage': self.coverage}})
+        if report['candidates']:
+            self.start_delivery(slot, report['candidates'])
+
+    def start_delivery(self, slot: str, candidates: List[Dict]):
+        # Sending can take a while; worker connections keep being read meanwhile
+        task = asyncio.create_task(self.deliver(slot, candidates))
+        self._deliveries.add(task)
+        task.add_done_callback(self._deliveries.discard)
+
+    async def deliver(self, slot: str, candidates: List[Dict]):
+        with log_context(scan_id=slot):
+            try:
+                await self.on_candidates(candidates)
+            except Exception as e:
+                logger.error("Error handling candidates of scan %s: %s", slot, e)
+
+    async def reap_loop(self):
+        """Drop silent workers and flush slots some worker never reported"""
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            now = time.monotonic()
+
+            for link in list(self.workers.values()):
+                if now - link.last_seen > WORKER_TIMEOUT:
+                    logger.warning("Worker %s timed out", link.worker_id)
+                    link.writer.close()
+
+            for slot, report in list(self.reports.items()):
+                if now - report['opened'] > SCAN_REPORT_TIMEOUT:
+                    await self.flush(slot)
+
+class ShardWorker:
+    """Analyzes the coins the coordinator assigns and reports candidates.
+
+    Workers touch neither the database nor Telegram; they reconnect with
+    backoff when the coordinator is unreachable.
+    """
+
+    def __init__(self, analyzer, worker_id: str = WORKER_ID, host: str = CLUSTER_HOST,
+                 port: int = CLUSTER_PORT, token: str = CLUSTER_TOKEN):
+        self.analyzer = analyzer
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.host = host
+        self.port = port
+        self.token = token
+        self.cooldowns = CooldownTracker()
+        self.planner = ScanPlanner(self.cooldowns, coins=[])
+        self.last_slot = None
+        self.writer = None
+        # Watches the assigned coins' live klines between scans
+        self.triggers = None
+        if EVENT_TRIGGERS and RECORD_MODE != 'replay':
+            self.triggers = TriggerWatcher(analyzer, self.process_coin, self.cooldowns)
+
+    async def run(self):
+        """Serve the coordinator until cancelled"""
+        if self.triggers:
+            trigger_task = asyncio.create_task(self.triggers.run())
+        try:
+            await self.connect_loop()
+        finally:
+            if self.triggers:
+                trigger_task.cancel()
+                await self.triggers.stop()
+
+    async def connect_loop(self):
+        delay = 1
+        while True:
+            try:
+                reader, writer = await asyncio.open_connection(self.host, self.port)
+                delay = 1
+                await self.serve(reader, writer)
+                logger.warning("Coordinator closed the connection")
+            except (ConnectionError, OSError) as e:
+                logger.warning("Coordinator %s:%s unreachable: %s", self.host, self.port, e)
+            finally:
+                # The shard is reassigned while we are away
+                self.planner.coins = []
+                if self.triggers:
+                    self.triggers.watch([])
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60)
+
+    async def serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        await send_message(writer, {'type': 'hello', 'worker': self.worker_id, 'token': self.token})
+        self.writer = writer
+        tasks = [
+            asyncio.create_task(self.heartbeat_loop(writer)),
+            asyncio.create_task(self.scan_loop(writer))
+        ]
+
+        try:
+            async for line in reader:
+                self.handle(json.loads(line))
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.writer = None
+            writer.close()
+
+    def handle(self, message: Dict):
+        if message['type'] == 'assign':
+            self.planner.coins = message['coins']
+            self.cooldowns.load(message['cooldowns'].items())
+            if self.triggers:
+                self.triggers.watch(self.planner.coins)
+            logger.info("Assigned %d coins: %s", len(self.planner.coins), ', '.join(self.planner.coins))
+        elif message['type'] == 'cooldown':
+            self.cooldowns.mark(message['coin'], message['analyzed_at'])
+
+    async def heartbeat_loop(self, writer: asyncio.StreamWriter):
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            await send_message(writer, {'type': 'heartbeat'})
+
+    async def scan_loop(self, writer: asyncio.StreamWriter):
+        while True:
+            now = datetime.now()
+            slot = scan_slot(now)
+            if self.planner.is_scan_time(now) and slot != self.last_slot:
+                self.last_slot = slot
+                with log_context(scan_id=slot):
+                    candidates = await self.scan()
+                await send_message(writer, {'type': 'report', 'slot': slot, 'candidates': candidates,
+                                            'coverage': self.planner.coverage})
+
+            await asyncio.sleep(60 - datetime.now().second)
+
+    async def scan(self) -> List[Dict]:
+        logger.info("Scanning %d assigned coins", len(self.planner.coins))
+        return await self.planner.run_scan(
+            self.analyzer.analyze_coin,
+            self.analyzer.priority_scores(self.planner.coins)
+        )
+
+    async def process_coin(self, coin: str, reasons: List[str]):
+        """Analyze a triggered coin and report it at once if it qualifies"""
+        with log_context(scan_id=f"trigger-{coin}"):
+            logger.info("%s: triggered by %s", coin, ', '.join(reasons))
+            analysis = await self.analyzer.analyze_coin(coin)
+            if analysis['confidence'] >= MIN_CONFIDENCE and self.writer:
+                await send_message(self.writer, {'type': 'trigger', 'coin': coin, 'candidates': [analysis]})
+
+async def run_worker():
+    """Entry point of a worker process (CLUSTER_ROLE=worker)"""
+    analyzer = CryptoAnalyzer()
+    worker = ShardWorker(analyzer)
+    logger.info("Worker %s connecting to %s:%s", worker.worker_id, worker.host, worker.port)
+    try:
+        await worker.run()
+    finally:
+        await analyzer.close_session()
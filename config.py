@@ -21,6 +21,8 @@ TOP_COINS = [
 
 # Scan intervals (minutes in hour)
 SCAN_INTERVALS = [1, 16, 31, 46]
+SCAN_BUDGET = int(os.getenv("SCAN_BUDGET", "720"))  # Seconds a scan cycle may run before skipping the rest
+PRIORITY_INTERVAL = "1h"  # Buffered candles the scan priority is scored from (refreshed by the regime update)
 
 # Analysis timeframes
 TIMEFRAMES = {
@@ -29,21 +31,113 @@ TIMEFRAMES = {
     '4h': {'weight': 1.5, 'limit': 100}
 }
 
+# Analysis mode: "cascade" (skip lower timeframes once a coin cannot pass) or "full"
+ANALYSIS_MODE = os.getenv("ANALYSIS_MODE", "cascade")
+CANDLE_CACHE_SIZE = 128  # (symbol, timeframe) candle buffers kept for incremental fetches
+ANALYSIS_CACHE_SIZE = 256  # Memoized closed-candle analysis states
+# Strategies evaluated per coin, in priority order (see strategy_engine.py)
+STRATEGIES = [name.strip() for name in os.getenv("STRATEGIES", "trend_volume").split(",") if name.strip()]
+
 # Trading parameters
 MIN_CONFIDENCE = 100  # Only send signals with 100% confidence
 RISK_PERCENT = 1.0  # Maximum 1% risk per trade
 MIN_RR_RATIO = 1.5  # Minimum Risk/Reward ratio
 
+# Market regime filter
+REGIME_INTERVAL = "1h"  # Candles used for the cross-coin return matrix
+REGIME_WINDOW = 48  # Returns per coin
+REGIME_MAX_CORRELATION = 0.8  # Same-direction signals this correlated with a sent one are dropped in a scan
+
 # Signal monitoring
 MONITORING_INTERVAL = 5  # Check active signals every 5 minutes (in minutes)
+INTRABAR_INTERVAL = "1m"  # Candles used to resolve TP/SL hits between checks
+INTRABAR_MAX_BARS = 1000  # Candles fetched per symbol and check; older gaps catch up next check
+# Bar that touches both TP and SL: "sl_first" (conservative), "tp_first",
+# or "ohlc_path" (bullish bar assumed to trade open-low-high-close, bearish open-high-low-close)
+INTRABAR_TIE_POLICY = os.getenv("INTRABAR_TIE_POLICY", "sl_first")
 ANALYSIS_COOLDOWN = 120  # Don't analyze same coin for 2 hours (in minutes)
 
+# Event triggers: analyze a coin between scans when its live klines show a
+# volume spike, a support/resistance break or a sharp move
+EVENT_TRIGGERS = os.getenv("EVENT_TRIGGERS", "true").lower() == "true"
+TRIGGER_INTERVAL = "1m"  # Kline stream watched
+TRIGGER_VOLUME_BARS = 20  # Closed bars the volume average is taken over
+TRIGGER_MOVE_BARS = 5  # Window of the sharp move check
+TRIGGER_MOVE_PERCENT = 1.0  # Price change within the window that counts as sharp
+TRIGGER_LEVEL_INTERVAL = "1h"  # Buffered candles support/resistance come from
+TRIGGER_DEBOUNCE = 3  # Seconds conditions are collected before analyzing once
+TRIGGER_COOLDOWN = 900  # Seconds before the same coin can trigger again
+TRIGGER_CONCURRENCY = 2  # Triggered analyses running at once
+
 # Daily summary
 SUMMARY_HOUR = 23  # Send daily summary at 11 PM
 SUMMARY_MINUTE = 0
 
+# Logging: LOG_FORMAT "text" or "json" (one object per line, with scan/signal ids)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+
+# Traffic recording: RECORD_MODE "off", "record" (append Binance/Telegram calls
+# to RECORD_FILE) or "replay" (answer them from RECORD_FILE instead of the network)
+RECORD_MODE = os.getenv("RECORD_MODE", "off")
+RECORD_FILE = os.getenv("RECORD_FILE", "traffic.jsonl.gz")
+REPLAY_SPEED = float(os.getenv("REPLAY_SPEED", "1"))  # Scales recorded latency; 0 = as fast as possible
+# A replay works on scratch copies, never on the live database and snapshot
+REPLAY_DATABASE_FILE = os.getenv("REPLAY_DATABASE_FILE", "replay_trading_bot.db")
+REPLAY_SNAPSHOT_FILE = os.getenv("REPLAY_SNAPSHOT_FILE", "replay_runtime_snapshot.json.gz")
+
+# Signal charts: candles with entry/SL/TP levels, uploaded once per signal
+SIGNAL_CHARTS = os.getenv("SIGNAL_CHARTS", "true").lower() == "true"
+CHART_INTERVAL = "15m"  # Buffered candles the chart is drawn from
+CHART_CANDLES = 60  # Most recent candles shown
+CHART_WIDTH = 800
+CHART_HEIGHT = 450
+CHART_CACHE_SIZE = 64  # Rendered charts (and their Telegram file_id) kept per signal
+
+# Update delivery: "polling" or "webhook"
+DELIVERY_MODE = os.getenv("DELIVERY_MODE", "polling")
+
+# Webhook settings (used when DELIVERY_MODE=webhook)
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")  # Public base URL, e.g. https://bot.example.com
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", os.getenv("PORT", "8443")))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")  # Required in webhook mode
+WEBHOOK_SSL_CERT = os.getenv("WEBHOOK_SSL_CERT", "")  # Leave empty when TLS ends at a proxy
+WEBHOOK_SSL_KEY = os.getenv("WEBHOOK_SSL_KEY", "")
+
 # Database settings
 DATABASE_FILE = "trading_bot.db"
+DB_SYNCHRONOUS = "NORMAL"  # Safe with WAL, one fsync per checkpoint instead of per commit
+DB_CACHE_SIZE_KB = 16384  # 16 MB page cache
+DB_MMAP_SIZE = 268435456  # 256 MB memory-mapped I/O
+DB_BUSY_TIMEOUT_MS = 5000
+DB_CACHED_STATEMENTS = 256  # Prepared statements kept per connection
+DB_READER_THREADS = 4  # Reader pool of the async database façade
+WRITE_BUFFER_INTERVAL = 1.0  # Flush buffered writes after at most this many seconds
+WRITE_BUFFER_MAX = 500  # ...or as soon as this many writes are pending
+
+# Runtime snapshot (candle buffers, analysis states, scheduler state) for warm restarts
+SNAPSHOT_FILE = os.getenv("SNAPSHOT_FILE", "runtime_snapshot.json.gz")
+SNAPSHOT_INTERVAL = 300  # Seconds between snapshots
+
+# Cluster settings (CLUSTER_ROLE: standalone | notifier | worker)
+CLUSTER_ROLE = os.getenv("CLUSTER_ROLE", "standalone")
+CLUSTER_HOST = os.getenv("CLUSTER_HOST", "127.0.0.1")  # Notifier listens here, workers connect here
+CLUSTER_PORT = int(os.getenv("CLUSTER_PORT", "8765"))
+CLUSTER_TOKEN = os.getenv("CLUSTER_TOKEN", "")  # Shared secret workers present on connect
+WORKER_ID = os.getenv("WORKER_ID", "")  # Defaults to hostname-pid
+HEARTBEAT_INTERVAL = 10  # Seconds between worker heartbeats
+WORKER_TIMEOUT = 30  # A worker silent this long is dropped and its shard reassigned
+SCAN_REPORT_TIMEOUT = 300  # Seconds to wait for every worker's report of a scan slot
+NOTIFIER_LEASE_TTL = 30  # Seconds; renewed every third of it
+
+# Retention settings
+SIGNAL_RETENTION_DAYS = int(os.getenv("SIGNAL_RETENTION_DAYS", "30"))  # Closed signals older than this move to signals_archive
+USER_RETENTION_DAYS = int(os.getenv("USER_RETENTION_DAYS", "90"))  # Deactivated users older than this are deleted
+RETENTION_HOUR = 3  # Daily retention run (local time)
+ARCHIVE_BATCH_SIZE = 1000  # Signals moved per transaction
+VACUUM_PAGES = 2000  # Free pages returned to the OS per run (0 = all)
 
 # Binance API endpoints
 BINANCE_API_BASE = "https://fapi.binance.com/fapi/v1"
@@ -53,6 +147,7 @@ BINANCE_ENDPOINTS = {
     'price': f"{BINANCE_API_BASE}/ticker/price",
     'depth': f"{BINANCE_API_BASE}/depth"
 }
+BINANCE_WS_BASE = "wss://fstream.binance.com/stream"  # Combined streams
 
 # Take profit levels (percentages from entry)
 TP_LEVELS = {
@@ -65,6 +160,16 @@ TP_LEVELS = {
 # Stop loss percentage
 SL_PERCENT = 0.05  # 5% stop loss
 
+# Trade level sizing: "percent" (TP_LEVELS/SL_PERCENT) or "atr" (volatility and support/resistance based).
+# In "atr" mode TP4 is always at least 2x the widest stop, so MIN_RR_RATIO never rejects a signal.
+LEVEL_MODE = os.getenv("LEVEL_MODE", "percent")
+ATR_PERIOD = 14
+ATR_SL_MULT = 1.5  # Stop distance in ATRs when support/resistance is unusable
+ATR_SL_BUFFER = 0.25  # Stop placed this many ATRs beyond support/resistance
+ATR_SL_MIN = 0.75  # Structure stops are kept between ATR_SL_MIN and ATR_SL_MAX ATRs
+ATR_SL_MAX = 3.0
+ATR_TP_MULTIPLES = [1.0, 2.0, 3.5, 6.0]  # TP1-TP4 distance in ATRs
+
 # Volume analysis thresholds
 VOLUME_SPIKE_THRESHOLD = 1.5  # 1.5x average volume
 MIN_VOLUME_RATIO = 0.8  # Minimum volume compared to average
@@ -1,170 +1,558 @@
 # database.py - Database Management
 import sqlite3
-from datetime import datetime, timedelta
-from typing import List, Dict
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, date, timezone
+from typing import List, Dict, Tuple
 import logging
 
-from config import DATABASE_FILE, ADMIN_ID
+from config import (
+    DATABASE_FILE, ADMIN_ID,
+    DB_SYNCHRONOUS, DB_CACHE_SIZE_KB, DB_MMAP_SIZE, DB_BUSY_TIMEOUT_MS, DB_CACHED_STATEMENTS,
+    SIGNAL_RETENTION_DAYS, USER_RETENTION_DAYS, ARCHIVE_BATCH_SIZE, VACUUM_PAGES
+)
+from roster import Roster
+from scan_planner import CooldownTracker
+from subscriptions import Subscription, SubscriptionIndex
+from write_buffer import WriteBehindBuffer
 
 logger = logging.getLogger(__name__)
 
+# Format of SQLite CURRENT_TIMESTAMP (always UTC)
+SQLITE_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Key of the whole-day row in daily_stats
+ALL_COINS = '*'
+
+def local_day(sent_time: str) -> str:
+    """Local calendar day (YYYY-MM-DD) of a UTC SQLite timestamp"""
+    utc = datetime.strptime(sent_time, SQLITE_TIME_FORMAT).replace(tzinfo=timezone.utc)
+    return utc.astimezone().date().isoformat()
+
+def utc_timestamp(value: str) -> float:
+    """Epoch seconds of a UTC SQLite timestamp"""
+    return datetime.strptime(value[:19], SQLITE_TIME_FORMAT).replace(tzinfo=timezone.utc).timestamp()
+
+def stats_contribution(status: str, profit_percent: float) -> Tuple[int, int, int, float]:
+    """(active, wins, losses, profit) a signal in this state adds to daily_stats"""
+    if status == 'active':
+        return 1, 0, 0, 0.0
+    if status == 'completed':
+        return 0, 1 if profit_percent > 0 else 0, 0, profit_percent
+    if status == 'stopped':
+        return 0, 0, 1, profit_percent
+    return 0, 0, 0, 0.0
+
+# Local start of a signal's day / week (Monday) / month, as SQLite expressions
+ROLLUP_PERIODS = {
+    'day': "DATE(sent_time, 'localtime')",
+    'week': "DATE(sent_time, 'localtime', 'weekday 0', '-6 days')",
+    'month': "DATE(sent_time, 'localtime', 'start of month')",
+}
+
+def period_start(period: str, day: date) -> str:
+    """First day (YYYY-MM-DD) of the day / week (Monday) / month containing a day"""
+    if period == 'week':
+        day -= timedelta(days=day.weekday())
+    elif period == 'month':
+        day = day.replace(day=1)
+    return day.isoformat()
+
+def rollup_keys(sent_time: str, coin: str, direction: str) -> List[Tuple[str, str, str, str]]:
+    """(period, period_start, coin, direction) rollup rows a signal counts in"""
+    day = date.fromisoformat(local_day(sent_time))
+    return [(period, period_start(period, day), coin_key, direction_key)
+            for period in ROLLUP_PERIODS
+            for coin_key in (coin, ALL_COINS)
+            for direction_key in (direction, ALL_COINS)]
+
+def rollup_backfill() -> List[str]:
+    """Statements filling performance_rollups from the already closed signals"""
+    closed = '''
+        SELECT sent_time, coin, direction, status, profit_percent FROM signals
+        WHERE status IN ('completed', 'stopped')
+        UNION ALL
+        SELECT sent_time, coin, direction, status, profit_percent FROM signals_archive
+        WHERE status IN ('completed', 'stopped')
+    '''
+    return [
+        f'''
+        INSERT INTO performance_rollups
+            (period, period_start, coin, direction, closed, wins, losses, total_profit)
+        SELECT '{period}', {start}, {coin}, {direction}, COUNT(*),
+               COUNT(CASE WHEN status = 'completed' AND profit_percent > 0 THEN 1 END),
+               COUNT(CASE WHEN status = 'stopped' THEN 1 END),
+               TOTAL(profit_percent)
+        FROM ({closed}) GROUP BY 2, 3, 4
+        '''
+        for period, start in ROLLUP_PERIODS.items()
+        for coin in ('coin', f"'{ALL_COINS}'")
+        for direction in ('direction', f"'{ALL_COINS}'")
+    ]
+
+# Schema migrations, applied in order and tracked with PRAGMA user_version
+MIGRATIONS = [
+    # 1: index-backed signal queries
+    [
+        'CREATE INDEX IF NOT EXISTS idx_signals_sent_time ON signals (sent_time)',
+        'CREATE INDEX IF NOT EXISTS idx_signals_status_coin ON signals (status, coin)',
+    ],
+    # 2: incrementally maintained per-day (and per-coin) counters
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS daily_stats (
+            day TEXT NOT NULL,
+            coin TEXT NOT NULL,
+            total_signals INTEGER DEFAULT 0,
+            wins INTEGER DEFAULT 0,
+            losses INTEGER DEFAULT 0,
+            active INTEGER DEFAULT 0,
+            total_profit REAL DEFAULT 0,
+            PRIMARY KEY (day, coin)
+        )
+        ''',
+        '''
+        INSERT INTO daily_stats (day, coin, total_signals, wins, losses, active, total_profit)
+        SELECT DATE(sent_time, 'localtime'), coin, COUNT(*),
+               COUNT(CASE WHEN status = 'completed' AND profit_percent > 0 THEN 1 END),
+               COUNT(CASE WHEN status = 'stopped' THEN 1 END),
+               COUNT(CASE WHEN status = 'active' THEN 1 END),
+               TOTAL(CASE WHEN status IN ('completed', 'stopped') THEN profit_percent END)
+        FROM signals GROUP BY 1, 2
+        ''',
+        '''
+        INSERT INTO daily_stats (day, coin, total_signals, wins, losses, active, total_profit)
+        SELECT day, '*', SUM(total_signals), SUM(wins), SUM(losses), SUM(active), TOTAL(total_profit)
+        FROM daily_stats GROUP BY day
+        ''',
+    ],
+    # 3: retention - archive table for closed signals, deactivation time for users
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS signals_archive (
+            id INTEGER PRIMARY KEY,
+            signal_number INTEGER,
+            coin TEXT,
+            direction TEXT,
+            entry REAL,
+            stop_loss REAL,
+            tp1 REAL,
+            tp2 REAL,
+            tp3 REAL,
+            tp4 REAL,
+            rr_ratio REAL,
+            sent_time TIMESTAMP,
+            status TEXT,
+            profit_percent REAL,
+            closed_time TIMESTAMP,
+            archived_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_signals_closed_time ON signals (closed_time)',
+        'ALTER TABLE users ADD COLUMN deactivated_time TIMESTAMP',
+    ],
+    # 4: close time (ms) of the last candle checked for TP/SL hits
+    [
+        'ALTER TABLE signals ADD COLUMN last_checked INTEGER',
+    ],
+    # 5: named leases (single notifier)
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS leases (
+            name TEXT PRIMARY KEY,
+            holder TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+        ''',
+    ],
+    # 6: performance rollups by day/week/month, coin and direction; max adverse move per signal
+    [
+        'ALTER TABLE signals ADD COLUMN max_adverse REAL DEFAULT 0',
+        'ALTER TABLE signals_archive ADD COLUMN max_adverse REAL DEFAULT 0',
+        '''
+        CREATE TABLE IF NOT EXISTS performance_rollups (
+            period TEXT NOT NULL,
+            period_start TEXT NOT NULL,
+            coin TEXT NOT NULL,
+            direction TEXT NOT NULL,
+            closed INTEGER DEFAULT 0,
+            wins INTEGER DEFAULT 0,
+            losses INTEGER DEFAULT 0,
+            total_profit REAL DEFAULT 0,
+            max_adverse REAL DEFAULT 0,
+            PRIMARY KEY (period, coin, direction, period_start)
+        )
+        ''',
+        *rollup_backfill(),
+    ],
+    # 7: users deactivated before migration 3 have no deactivation time and would never
+    # be pruned; their retention period starts now
+    [
+        'UPDATE users SET deactivated_time = CURRENT_TIMESTAMP WHERE is_active = 0 AND deactivated_time IS NULL',
+    ],
+]
+
+SIGNAL_COLUMNS = (
+    'id, signal_number, coin, direction, entry, stop_loss, tp1, tp2, tp3, tp4, '
+    'rr_ratio, sent_time, status, profit_percent, closed_time, max_adverse'
+)
+
 class Database:
-    def __init__(self):
-        self.db_file = DATABASE_FILE
+    def __init__(self, db_file: str = DATABASE_FILE):
+        self.db_file = db_file
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._readers = []
+        self.write_buffer = WriteBehindBuffer()
+        self.conn = self.connect()
+        self.roster = Roster()
+        self.subscriptions = SubscriptionIndex()
+        self.cooldowns = CooldownTracker()
         self.init_database()
+        self.load_roster()
+        self.load_subscriptions()
+        self.load_cooldowns()
+    
+    def connect(self, read_only: bool = False) -> sqlite3.Connection:
+        """Open a connection with WAL journaling and tuned pragmas"""
+        # isolation_level=None: transactions are opened explicitly by transaction()
+        conn = sqlite3.connect(
+            self.db_file,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=DB_CACHED_STATEMENTS
+        )
+        
+        conn.execute(f'PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}')
+        if not read_only:
+            # Must precede the WAL switch: that writes the header of a new file,
+            # after which auto_vacuum only changes through a full VACUUM
+            conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(f'PRAGMA synchronous={DB_SYNCHRONOUS}')
+        conn.execute(f'PRAGMA cache_size=-{DB_CACHE_SIZE_KB}')
+        conn.execute(f'PRAGMA mmap_size={DB_MMAP_SIZE}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        if read_only:
+            conn.execute('PRAGMA query_only=ON')
+        
+        return conn
+    
+    def get_connection(self) -> sqlite3.Connection:
+        """Get the shared database connection"""
+        return self.conn
+    
+    @contextmanager
+    def transaction(self):
+        """Run a block in one write transaction and yield a cursor.
+        
+        Buffered write-behind writes are applied first, in the same transaction,
+        so immediate writes never overtake earlier buffered ones. Nested calls
+        from the same thread join the outer transaction.
+        """
+        with self._lock:
+            if self.conn.in_transaction:
+                yield self.conn.cursor()
+                return
+            
+            cursor = self.conn.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            writes = self.write_buffer.drain()
+            try:
+                for key, apply, args in writes:
+                    apply(cursor, *args)
+                yield cursor
+            except BaseException:
+                self.conn.execute('ROLLBACK')
+                self.write_buffer.restore(writes)
+                raise
+            else:
+                self.conn.execute('COMMIT')
+                self.write_buffer.settle(writes)
     
-    def get_connection(self):
-        """Get database connection"""
-        return sqlite3.connect(self.db_file)
+    def flush_writes(self):
+        """Commit buffered writes now (before a broadcast, on shutdown)"""
+        if len(self.write_buffer):
+            with self.transaction():
+                pass
+    
+    def flush_writes_if_due(self):
+        """Commit buffered writes once the oldest has waited the flush interval"""
+        if self.write_buffer.due():
+            self.flush_writes()
+    
+    def _buffer_write(self, key, apply, *args):
+        if self.write_buffer.put(key, apply, *args):
+            self.flush_writes()
+    
+    def reader(self) -> sqlite3.Connection:
+        """Get this thread's read-only connection.
+        
+        WAL lets readers run beside the writer, so reads never wait on the write lock.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self.connect(read_only=True)
+            self._local.conn = conn
+            with self._lock:
+                self._readers.append(conn)
+        return conn
+    
+    @contextmanager
+    def read_cursor(self):
+        """Yield a cursor on this thread's read connection"""
+        cursor = self.reader().cursor()
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+    
+    def close(self):
+        """Flush buffered writes and close the writer and all reader connections"""
+        self.flush_writes()
+        with self._lock:
+            for conn in self._readers:
+                conn.close()
+            self._readers.clear()
+            self.conn.close()
     
     def init_database(self):
         """Initialize database tables"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Users table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                user_id INTEGER PRIMARY KEY,
-                username TEXT,
-                first_name TEXT,
-                joined_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                is_blocked BOOLEAN DEFAULT 0,
-                is_active BOOLEAN DEFAULT 1
-            )
-        ''')
-        
-        # Admins table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS admins (
-                admin_id INTEGER PRIMARY KEY,
-                added_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Signals table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS signals (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                signal_number INTEGER,
-                coin TEXT,
-                direction TEXT,
-                entry REAL,
-                stop_loss REAL,
-                tp1 REAL,
-                tp2 REAL,
-                tp3 REAL,
-                tp4 REAL,
-                rr_ratio REAL,
-                sent_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                status TEXT DEFAULT 'active',
-                profit_percent REAL DEFAULT 0,
-                closed_time TIMESTAMP
-            )
-        ''')
-        
-        # Analyzed coins table (for cooldown tracking)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS analyzed_coins (
-                coin TEXT PRIMARY KEY,
-                last_analysis TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Add main admin if not exists
-        cursor.execute('INSERT OR IGNORE INTO admins (admin_id) VALUES (?)', (ADMIN_ID,))
-        
-        conn.commit()
-        conn.close()
+        self.enable_incremental_vacuum()
+        
+        with self.transaction() as cursor:
+            # Users table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS users (
+                    user_id INTEGER PRIMARY KEY,
+                    username TEXT,
+                    first_name TEXT,
+                    joined_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    is_blocked BOOLEAN DEFAULT 0,
+                    is_active BOOLEAN DEFAULT 1
+                )
+            ''')
+            
+            # Admins table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS admins (
+                    admin_id INTEGER PRIMARY KEY,
+                    added_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            # Signals table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS signals (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    signal_number INTEGER,
+                    coin TEXT,
+                    direction TEXT,
+                    entry REAL,
+                    stop_loss REAL,
+                    tp1 REAL,
+                    tp2 REAL,
+                    tp3 REAL,
+                    tp4 REAL,
+                    rr_ratio REAL,
+                    sent_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    status TEXT DEFAULT 'active',
+                    profit_percent REAL DEFAULT 0,
+                    closed_time TIMESTAMP
+                )
+            ''')
+            
+            # Analyzed coins table (for cooldown tracking)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS analyzed_coins (
+                    coin TEXT PRIMARY KEY,
+                    last_analysis TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            # Subscriptions table (signal preferences, empty = all)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS subscriptions (
+                    user_id INTEGER PRIMARY KEY,
+                    coins TEXT DEFAULT '',
+                    directions TEXT DEFAULT '',
+                    min_rr REAL DEFAULT 0
+                )
+            ''')
+            
+            # Add main admin if not exists
+            cursor.execute('INSERT OR IGNORE INTO admins (admin_id) VALUES (?)', (ADMIN_ID,))
+            
+            self.migrate(cursor)
         
         logger.info("Database initialized successfully")
     
+    def enable_incremental_vacuum(self):
+        """Switch the file to auto_vacuum=INCREMENTAL.
+        
+        New files get it from connect(); files created before need one full VACUUM.
+        """
+        with self._lock:
+            if self.conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+                return
+            
+            logger.info("Rebuilding database file for incremental vacuum...")
+            self.conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+            self.conn.execute('VACUUM')
+    
+    def migrate(self, cursor):
+        """Apply pending schema migrations"""
+        cursor.execute('PRAGMA user_version')
+        version = cursor.fetchone()[0]
+        
+        for number, statements in enumerate(MIGRATIONS[version:], version + 1):
+            for statement in statements:
+                cursor.execute(statement)
+            cursor.execute(f'PRAGMA user_version = {number}')
+            logger.info("Applied database migration %d", number)
+    
+    def load_roster(self):
+        """Load users and admins into the in-memory roster"""
+        with self.read_cursor() as cursor:
+            cursor.execute('SELECT user_id, is_blocked, is_active FROM users')
+            users = cursor.fetchall()
+            
+            cursor.execute('SELECT admin_id FROM admins')
+            admins = [row[0] for row in cursor.fetchall()]
+        
+        self.roster.load(users, admins)
+        logger.info("Roster loaded: %d users, %d admins", len(users), len(admins))
+    
+    def load_subscriptions(self):
+        """Build the subscription index from stored preferences"""
+        with self.read_cursor() as cursor:
+            cursor.execute('SELECT user_id FROM users')
+            user_ids = [row[0] for row in cursor.fetchall()]
+            
+            cursor.execute('SELECT user_id, coins, directions, min_rr FROM subscriptions')
+            rows = [(row[0], self._row_to_subscription(row)) for row in cursor.fetchall()]
+        
+        self.subscriptions.load(user_ids, rows)
+        logger.info("Subscriptions loaded: %d custom", len(rows))
+    
+    def load_cooldowns(self):
+        """Load last analysis times into the in-memory cooldown tracker"""
+        with self.read_cursor() as cursor:
+            cursor.execute('SELECT coin, last_analysis FROM analyzed_coins')
+            rows = [(coin, utc_timestamp(last_analysis)) for coin, last_analysis in cursor.fetchall()
+                    if last_analysis]
+        
+        self.cooldowns.load(rows)
+    
+    @staticmethod
+    def _row_to_subscription(row) -> Subscription:
+        coins = [c for c in (row[1] or '').split(',') if c]
+        directions = [d for d in (row[2] or '').split(',') if d]
+        return Subscription(coins, directions, row[3])
+    
     # User management
     def add_user(self, user_id: int, username: str, first_name: str):
-        """Add or update user"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
+        """Add or update user (write-behind; the roster is updated immediately)"""
+        self.roster.add_user(user_id)
+        self.subscriptions.ensure_user(user_id)
+        self._buffer_write(('user', user_id), self._apply_add_user, user_id, username, first_name)
+    
+    @staticmethod
+    def _apply_add_user(cursor, user_id: int, username: str, first_name: str):
+        # Upsert keeps joined_date and the block flag of returning users
         cursor.execute('''
-            INSERT OR REPLACE INTO users (user_id, username, first_name)
+            INSERT INTO users (user_id, username, first_name)
             VALUES (?, ?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET
+                username = excluded.username,
+                first_name = excluded.first_name,
+                is_active = 1,
+                deactivated_time = NULL
         ''', (user_id, username, first_name))
-        
-        conn.commit()
-        conn.close()
     
     def block_user(self, user_id: int):
         """Block a user"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('UPDATE users SET is_blocked = 1 WHERE user_id = ?', (user_id,))
+        with self.transaction() as cursor:
+            cursor.execute('UPDATE users SET is_blocked = 1 WHERE user_id = ?', (user_id,))
         
-        conn.commit()
-        conn.close()
+        self.roster.set_blocked(user_id, True)
         
-        logger.info(f"User {user_id} blocked")
+        logger.info("User %s blocked", user_id)
     
     def unblock_user(self, user_id: int):
         """Unblock a user"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.transaction() as cursor:
+            cursor.execute('UPDATE users SET is_blocked = 0 WHERE user_id = ?', (user_id,))
         
-        cursor.execute('UPDATE users SET is_blocked = 0 WHERE user_id = ?', (user_id,))
+        self.roster.set_blocked(user_id, False)
         
-        conn.commit()
-        conn.close()
+        logger.info("User %s unblocked", user_id)
+    
+    def deactivate_user(self, user_id: int):
+        """Stop sending to a user who blocked the bot or deleted the chat"""
+        with self.transaction() as cursor:
+            cursor.execute('''
+                UPDATE users SET is_active = 0, deactivated_time = CURRENT_TIMESTAMP
+                WHERE user_id = ? AND is_active = 1
+            ''', (user_id,))
+        
+        self.roster.set_active(user_id, False)
         
-        logger.info(f"User {user_id} unblocked")
+        logger.debug("User %s deactivated", user_id)
     
     def is_user_blocked(self, user_id: int) -> bool:
         """Check if user is blocked"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT is_blocked FROM users WHERE user_id = ?', (user_id,))
-        result = cursor.fetchone()
-        
-        conn.close()
-        
-        return result and result[0] == 1
+        return self.roster.is_blocked(user_id)
     
     def get_all_active_users(self) -> List[int]:
         """Get all active (not blocked) users"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT user_id FROM users WHERE is_blocked = 0 AND is_active = 1')
-        users = [row[0] for row in cursor.fetchall()]
-        
-        conn.close()
-        
-        return users
+        return self.roster.active_users()
+    
+    # Subscription management
+    def get_subscription(self, user_id: int) -> Subscription:
+        """Get signal preferences of a user"""
+        return self.subscriptions.get(user_id)
+    
+    def set_subscription(self, user_id: int, coins: List[str] = None,
+                         directions: List[str] = None, min_rr: float = None) -> Subscription:
+        """Update signal preferences; arguments left as None keep their current value"""
+        current = self.subscriptions.get(user_id)
+        sub = Subscription(
+            current.coins if coins is None else coins,
+            current.directions if directions is None else directions,
+            current.min_rr if min_rr is None else min_rr
+        )
+        
+        with self.transaction() as cursor:
+            cursor.execute('''
+                INSERT OR REPLACE INTO subscriptions (user_id, coins, directions, min_rr)
+                VALUES (?, ?, ?, ?)
+            ''', (user_id, ','.join(sorted(sub.coins)), ','.join(sorted(sub.directions)), sub.min_rr))
+        
+        self.subscriptions.set(user_id, sub)
+        return sub
+    
+    def get_signal_audience(self, coin: str, direction: str, rr_ratio: float = None) -> List[int]:
+        """Get active users subscribed to a signal"""
+        return [
+            user_id for user_id in self.subscriptions.match(coin, direction, rr_ratio)
+            if self.roster.is_active(user_id)
+        ]
     
     # Admin management
     def is_admin(self, user_id: int) -> bool:
         """Check if user is admin"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT admin_id FROM admins WHERE admin_id = ?', (user_id,))
-        result = cursor.fetchone()
-        
-        conn.close()
-        
-        return result is not None
+        return self.roster.is_admin(user_id)
     
     def add_admin(self, admin_id: int):
         """Add new admin"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('INSERT OR IGNORE INTO admins (admin_id) VALUES (?)', (admin_id,))
+        with self.transaction() as cursor:
+            cursor.execute('INSERT OR IGNORE INTO admins (admin_id) VALUES (?)', (admin_id,))
         
-        conn.commit()
-        conn.close()
+        self.roster.add_admin(admin_id)
         
-        logger.info(f"Admin {admin_id} added")
+        logger.info("Admin %s added", admin_id)
     
     def remove_admin(self, admin_id: int):
         """Remove admin (except main admin)"""
@@ -172,158 +560,179 @@ class Database:
             logger.warning("Cannot remove main admin")
             return False
         
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('DELETE FROM admins WHERE admin_id = ?', (admin_id,))
+        with self.transaction() as cursor:
+            cursor.execute('DELETE FROM admins WHERE admin_id = ?', (admin_id,))
         
-        conn.commit()
-        conn.close()
+        self.roster.remove_admin(admin_id)
         
-        logger.info(f"Admin {admin_id} removed")
+        logger.info("Admin %s removed", admin_id)
         return True
     
     def get_all_admins(self) -> List[int]:
         """Get all admins"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT admin_id FROM admins')
-        admins = [row[0] for row in cursor.fetchall()]
-        
-        conn.close()
-        
-        return admins
+        return self.roster.admins()
     
     # Signal management
     def add_signal(self, coin: str, direction: str, entry: float, 
-                   stop_loss: float, take_profits: List[float], rr_ratio: float) -> int:
-        """Add new trading signal"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Get today's signal count
-        signal_number = self.get_today_signal_count() + 1
-        
+                   stop_loss: float, take_profits: List[float], rr_ratio: float) -> Tuple[int, int]:
+        """Add new trading signal and return (signal_id, signal_number)"""
+        now = datetime.now(timezone.utc)
+        sent_time = now.strftime(SQLITE_TIME_FORMAT)
+        day = now.astimezone().date().isoformat()
+        
+        with self.transaction() as cursor:
+            # The whole-day counter doubles as the atomic per-day signal sequence
+            for key in (ALL_COINS, coin):
+                cursor.execute('''
+                    INSERT INTO daily_stats (day, coin, total_signals, active)
+                    VALUES (?, ?, 1, 1)
+                    ON CONFLICT(day, coin) DO UPDATE SET
+                        total_signals = total_signals + 1,
+                        active = active + 1
+                ''', (day, key))
+            
+            cursor.execute('''
+                SELECT total_signals FROM daily_stats WHERE day = ? AND coin = ?
+            ''', (day, ALL_COINS))
+            signal_number = cursor.fetchone()[0]
+            
+            cursor.execute('''
+                INSERT INTO signals 
+                (signal_number, coin, direction, entry, stop_loss, tp1, tp2, tp3, tp4, rr_ratio, sent_time)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (signal_number, coin, direction, entry, stop_loss, 
+                  take_profits[0], take_profits[1], take_profits[2], take_profits[3], rr_ratio, sent_time))
+            
+            signal_id = cursor.lastrowid
+        
+        logger.info("Signal #%s added for %s", signal_number, coin)
+        return signal_id, signal_number
+    
+    def update_signal_status(self, signal_id: int, status: str, profit_percent: float,
+                             max_adverse: float = 0.0):
+        """Update signal status (write-behind, applied with the next flush)"""
+        closed_time = datetime.now(timezone.utc).strftime(SQLITE_TIME_FORMAT)
+        self._buffer_write(('status', signal_id), self._apply_signal_status,
+                           signal_id, status, profit_percent, closed_time, max_adverse)
+        
+        logger.info("Signal %s updated: %s, profit: %s%%", signal_id, status, profit_percent)
+    
+    @staticmethod
+    def _apply_signal_status(cursor, signal_id: int, status: str, profit_percent: float,
+                             closed_time: str, max_adverse: float = 0.0):
         cursor.execute('''
-            INSERT INTO signals 
-            (signal_number, coin, direction, entry, stop_loss, tp1, tp2, tp3, tp4, rr_ratio)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (signal_number, coin, direction, entry, stop_loss, 
-              take_profits[0], take_profits[1], take_profits[2], take_profits[3], rr_ratio))
+            SELECT coin, direction, sent_time, status, profit_percent, max_adverse
+            FROM signals WHERE id = ?
+        ''', (signal_id,))
+        row = cursor.fetchone()
+        if row is None:
+            logger.warning("Signal %s not found", signal_id)
+            return
         
-        signal_id = cursor.lastrowid
-        
-        conn.commit()
-        conn.close()
-        
-        logger.info(f"Signal #{signal_number} added for {coin}")
-        return signal_id
-    
-    def update_signal_status(self, signal_id: int, status: str, profit_percent: float):
-        """Update signal status"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        coin, direction, sent_time, old_status, old_profit, old_adverse = row
+        max_adverse = max(max_adverse, old_adverse or 0.0)
         
         cursor.execute('''
             UPDATE signals 
-            SET status = ?, profit_percent = ?, closed_time = CURRENT_TIMESTAMP
+            SET status = ?, profit_percent = ?, closed_time = ?, max_adverse = ?
             WHERE id = ?
-        ''', (status, profit_percent, signal_id))
-        
-        conn.commit()
-        conn.close()
-        
-        logger.info(f"Signal {signal_id} updated: {status}, profit: {profit_percent}%")
+        ''', (status, profit_percent, closed_time, max_adverse, signal_id))
+        
+        # A signal joins the rollups once, when it closes
+        if old_status == 'active' and status in ('completed', 'stopped'):
+            _, wins, losses, profit = stats_contribution(status, profit_percent)
+            cursor.executemany('''
+                INSERT INTO performance_rollups
+                    (period, period_start, coin, direction, closed, wins, losses, total_profit, max_adverse)
+                VALUES (?, ?, ?, ?, 1, ?, ?, ?, ?)
+                ON CONFLICT(period, coin, direction, period_start) DO UPDATE SET
+                    closed = closed + 1,
+                    wins = wins + excluded.wins,
+                    losses = losses + excluded.losses,
+                    total_profit = total_profit + excluded.total_profit,
+                    max_adverse = MAX(max_adverse, excluded.max_adverse)
+            ''', [(*key, wins, losses, profit, max_adverse)
+                  for key in rollup_keys(sent_time, coin, direction)])
+        
+        # Move the signal's contribution from its old state to the new one
+        old = stats_contribution(old_status, old_profit)
+        new = stats_contribution(status, profit_percent)
+        delta = [n - o for n, o in zip(new, old)]
+        
+        cursor.executemany('''
+            UPDATE daily_stats
+            SET active = active + ?, wins = wins + ?, losses = losses + ?,
+                total_profit = total_profit + ?
+            WHERE day = ? AND coin = ?
+        ''', [(*delta, local_day(sent_time), key) for key in (ALL_COINS, coin)])
     
-    def get_active_signals(self) -> List[Dict]:
-        """Get all active signals"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
+    def mark_signal_checked(self, signal_id: int, checked_until: int, max_adverse: float = 0.0):
+        """Record the close time (ms) of the last candle checked for a signal and
+        its largest adverse move so far (write-behind)"""
+        self._buffer_write(('checked', signal_id), self._apply_signal_checked,
+                           signal_id, checked_until, max_adverse)
+    
+    @staticmethod
+    def _apply_signal_checked(cursor, signal_id: int, checked_until: int, max_adverse: float = 0.0):
         cursor.execute('''
-            SELECT id, signal_number, coin, direction, entry, stop_loss, 
-                   tp1, tp2, tp3, tp4, rr_ratio, sent_time
-            FROM signals
-            WHERE status = 'active'
-        ''')
-        
-        signals = []
-        for row in cursor.fetchall():
-            signals.append({
-                'id': row[0],
-                'signal_number': row[1],
-                'coin': row[2],
-                'direction': row[3],
-                'entry': row[4],
-                'stop_loss': row[5],
-                'take_profits': [row[6], row[7], row[8], row[9]],
-                'rr_ratio': row[10],
-                'sent_time': row[11]
-            })
-        
-        conn.close()
+            UPDATE signals SET last_checked = ?, max_adverse = MAX(COALESCE(max_adverse, 0), ?)
+            WHERE id = ?
+        ''', (checked_until, max_adverse, signal_id))
+    
+    def get_active_signals(self) -> List[Dict]:
+        """Get all active signals, excluding ones with a buffered close"""
+        # Buffered state first: anything flushed after this is visible to the query
+        statuses = self.write_buffer.overlay('status')
+        checks = self.write_buffer.overlay('checked')
+        
+        with self.read_cursor() as cursor:
+            cursor.execute('''
+                SELECT id, signal_number, coin, direction, entry, stop_loss, 
+                       tp1, tp2, tp3, tp4, rr_ratio, sent_time, last_checked, max_adverse
+                FROM signals
+                WHERE status = 'active'
+            ''')
+            
+            signals = []
+            for row in cursor.fetchall():
+                pending = statuses.get(row[0])
+                if pending and pending[1] != 'active':
+                    continue
+                
+                checked = checks.get(row[0])
+                
+                signals.append({
+                    'id': row[0],
+                    'signal_number': row[1],
+                    'coin': row[2],
+                    'direction': row[3],
+                    'entry': row[4],
+                    'stop_loss': row[5],
+                    'take_profits': [row[6], row[7], row[8], row[9]],
+                    'rr_ratio': row[10],
+                    'sent_time': row[11],
+                    'last_checked': checked[1] if checked else row[12],
+                    'max_adverse': max(checked[2] if checked else 0.0, row[13] or 0.0)
+                })
         
         return signals
     
     def get_today_signal_count(self) -> int:
         """Get count of signals sent today"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        today = datetime.now().date()
-        cursor.execute('''
-            SELECT COUNT(*) FROM signals 
-            WHERE DATE(sent_time) = ?
-        ''', (today,))
-        
-        count = cursor.fetchone()[0]
-        
-        conn.close()
-        
-        return count
+        return self.get_daily_stats()['total_signals']
     
-    def get_daily_stats(self) -> Dict:
-        """Get daily trading statistics"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        today = datetime.now().date()
+    def get_daily_stats(self, day: date = None, coin: str = ALL_COINS) -> Dict:
+        """Get daily trading statistics (whole day by default, or for one coin)"""
+        day = (day or datetime.now().date()).isoformat()
         
-        # Total signals
-        cursor.execute('''
-            SELECT COUNT(*) FROM signals 
-            WHERE DATE(sent_time) = ?
-        ''', (today,))
-        total_signals = cursor.fetchone()[0]
-        
-        # Wins
-        cursor.execute('''
-            SELECT COUNT(*) FROM signals 
-            WHERE DATE(sent_time) = ? AND status = 'completed' AND profit_percent > 0
-        ''', (today,))
-        wins = cursor.fetchone()[0]
+        with self.read_cursor() as cursor:
+            cursor.execute('''
+                SELECT total_signals, wins, losses, active, total_profit
+                FROM daily_stats WHERE day = ? AND coin = ?
+            ''', (day, coin))
+            row = cursor.fetchone()
         
-        # Losses
-        cursor.execute('''
-            SELECT COUNT(*) FROM signals 
-            WHERE DATE(sent_time) = ? AND status = 'stopped'
-        ''', (today,))
-        losses = cursor.fetchone()[0]
-        
-        # Active signals
-        cursor.execute('''
-            SELECT COUNT(*) FROM signals 
-            WHERE DATE(sent_time) = ? AND status = 'active'
-        ''', (today,))
-        active = cursor.fetchone()[0]
-        
-        # Total profit
-        cursor.execute('''
-            SELECT SUM(profit_percent) FROM signals 
-            WHERE DATE(sent_time) = ? AND status IN ('completed', 'stopped')
-        ''', (today,))
-        total_profit = cursor.fetchone()[0] or 0
+        total_signals, wins, losses, active, total_profit = row or (0, 0, 0, 0, 0.0)
         
         # Average profit
         completed = wins + losses
@@ -332,8 +741,6 @@ class Database:
         # Win rate
         win_rate = (wins / completed * 100) if completed > 0 else 0
         
-        conn.close()
-        
         return {
             'total_signals': total_signals,
             'wins': wins,
@@ -344,34 +751,136 @@ class Database:
             'win_rate': round(win_rate, 1)
         }
     
+    def get_performance(self, period: str, coin: str = ALL_COINS, direction: str = ALL_COINS,
+                        count: int = 4) -> List[Dict]:
+        """Closed-signal performance of the latest `count` periods ('day', 'week', 'month'), newest first"""
+        with self.read_cursor() as cursor:
+            cursor.execute('''
+                SELECT period_start, closed, wins, losses, total_profit, max_adverse
+                FROM performance_rollups
+                WHERE period = ? AND coin = ? AND direction = ?
+                ORDER BY period_start DESC LIMIT ?
+            ''', (period, coin, direction, count))
+            rows = cursor.fetchall()
+        
+        report = []
+        for period_start, closed, wins, losses, total_profit, max_adverse in rows:
+            report.append({
+                'period_start': period_start,
+                'closed': closed,
+                'wins': wins,
+                'losses': losses,
+                'total_profit': round(total_profit, 2),
+                'avg_profit': round(total_profit / closed, 2) if closed else 0.0,
+                'win_rate': round(wins / closed * 100, 1) if closed else 0.0,
+                'max_adverse': round(max_adverse, 2)
+            })
+        return report
+    
     # Analyzed coins management
     def mark_coin_analyzed(self, coin: str):
-        """Mark coin as analyzed"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
+        """Mark coin as analyzed (in memory at once, persisted write-behind)"""
+        analyzed_at = self.cooldowns.mark(coin)
+        self._buffer_write(('coin', coin), self._apply_mark_coin, coin,
+                           datetime.fromtimestamp(analyzed_at, timezone.utc).strftime(SQLITE_TIME_FORMAT))
+    
+    @staticmethod
+    def _apply_mark_coin(cursor, coin: str, analyzed_at: str):
         cursor.execute('''
             INSERT OR REPLACE INTO analyzed_coins (coin, last_analysis)
-            VALUES (?, CURRENT_TIMESTAMP)
-        ''', (coin,))
-        
-        conn.commit()
-        conn.close()
+            VALUES (?, ?)
+        ''', (coin, analyzed_at))
     
     def was_recently_analyzed(self, coin: str, cooldown_minutes: int = 120) -> bool:
         """Check if coin was analyzed recently"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cutoff = datetime.now() - timedelta(minutes=cooldown_minutes)
-        
-        cursor.execute('''
-            SELECT last_analysis FROM analyzed_coins 
-            WHERE coin = ? AND last_analysis > ?
-        ''', (coin, cutoff))
-        
-        result = cursor.fetchone()
-        
-        conn.close()
+        return self.cooldowns.is_cooling(coin, cooldown_minutes)
+    
+    # Leases
+    def acquire_lease(self, name: str, holder: str, ttl: float) -> bool:
+        """Take or renew a lease; False while another holder's lease is unexpired"""
+        now = time.time()
+        
+        with self.transaction() as cursor:
+            cursor.execute('''
+                INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at
+                WHERE leases.holder = excluded.holder OR leases.expires_at < ?
+            ''', (name, holder, now + ttl, now))
+            cursor.execute('SELECT holder FROM leases WHERE name = ?', (name,))
+            return cursor.fetchone()[0] == holder
+    
+    def release_lease(self, name: str, holder: str):
+        with self.transaction() as cursor:
+            cursor.execute('DELETE FROM leases WHERE name = ? AND holder = ?', (name, holder))
+    
+    # Retention
+    def archive_signals(self, retention_days: int = SIGNAL_RETENTION_DAYS) -> int:
+        """Move signals closed more than retention_days ago into signals_archive"""
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=retention_days)).strftime(SQLITE_TIME_FORMAT)
+        archived = 0
+        
+        # Small batches keep each write transaction (and the writer lock) short
+        while True:
+            with self.transaction() as cursor:
+                cursor.execute('''
+                    SELECT id FROM signals
+                    WHERE status != 'active' AND closed_time < ?
+                    LIMIT ?
+                ''', (cutoff, ARCHIVE_BATCH_SIZE))
+                ids = [(row[0],) for row in cursor.fetchall()]
+                if not ids:
+                    break
+                
+                cursor.executemany(f'''
+                    INSERT OR REPLACE INTO signals_archive ({SIGNAL_COLUMNS})
+                    SELECT {SIGNAL_COLUMNS} FROM signals WHERE id = ?
+                ''', ids)
+                cursor.executemany('DELETE FROM signals WHERE id = ?', ids)
+            
+            archived += len(ids)
+        
+        if archived:
+            logger.info("Archived %d signals closed before %s", archived, cutoff)
+        return archived
+    
+    def prune_users(self, retention_days: int = USER_RETENTION_DAYS) -> int:
+        """Delete users deactivated more than retention_days ago (blocked users are kept)"""
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=retention_days)).strftime(SQLITE_TIME_FORMAT)
+        
+        with self.transaction() as cursor:
+            cursor.execute('''
+                SELECT user_id FROM users
+                WHERE is_active = 0 AND is_blocked = 0 AND deactivated_time < ?
+            ''', (cutoff,))
+            ids = [(row[0],) for row in cursor.fetchall()]
+            
+            cursor.executemany('DELETE FROM subscriptions WHERE user_id = ?', ids)
+            cursor.executemany('DELETE FROM users WHERE user_id = ?', ids)
+        
+        for (user_id,) in ids:
+            self.roster.remove_user(user_id)
+            self.subscriptions.remove(user_id)
+        
+        if ids:
+            logger.info("Pruned %d inactive users", len(ids))
+        return len(ids)
+    
+    def incremental_vacuum(self, pages: int = VACUUM_PAGES) -> int:
+        """Return up to `pages` free pages to the OS and truncate the WAL"""
+        with self._lock:
+            freelist = self.conn.execute('PRAGMA freelist_count').fetchone()[0]
+            self.conn.execute(f'PRAGMA incremental_vacuum({pages})').fetchall()
+            self.conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchall()
+        
+        return min(freelist, pages) if pages > 0 else freelist
+    
+    def run_retention(self) -> Dict:
+        """Archive old signals, prune inactive users and compact the file"""
+        result = {
+            'archived_signals': self.archive_signals(),
+            'pruned_users': self.prune_users(),
+            'vacuumed_pages': self.incremental_vacuum()
+        }
         
-        return result is not None
+        logger.info("Retention finished: %s", result)
+        return result
@@ -0,0 +1,195 @@
+# event_triggers.py - Out-of-cycle Analysis on Live Market Events
+#
+# Scans run four times an hour; between them a breakout would wait up to
+# 15 minutes. TriggerWatcher follows the 1m kline stream of every watched
+# coin over one Binance websocket (push, no extra polling) and checks cheap
+# conditions on each update. A coin that fires is analyzed right away.
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+import aiohttp
+
+from config import (
+    BINANCE_WS_BASE, TRIGGER_INTERVAL, TRIGGER_VOLUME_BARS, TRIGGER_MOVE_BARS,
+    TRIGGER_MOVE_PERCENT, TRIGGER_LEVEL_INTERVAL, TRIGGER_DEBOUNCE, TRIGGER_COOLDOWN,
+    TRIGGER_CONCURRENCY, VOLUME_SPIKE_THRESHOLD
+)
+from scan_planner import CooldownTracker
+
+logger = logging.getLogger(__name__)
+
+class _CoinFeed:
+    """Recent closed bars and last price of one coin, as seen on the stream"""
+
+    def __init__(self):
+        self.volumes = deque(maxlen=TRIGGER_VOLUME_BARS)
+        self.closes = deque(maxlen=TRIGGER_MOVE_BARS)
+        self.price: Optional[float] = None
+        self.levels: Optional[Dict] = None
+        self.levels_bar = None
+
+class TriggerWatcher:
+    """Fires ``on_trigger(coin, reasons)`` when a watched coin starts moving.
+
+    Conditions, checked on every kline update:
+    - volume: the forming bar's volume exceeds VOLUME_SPIKE_THRESHOLD times
+      the average of the last TRIGGER_VOLUME_BARS closed bars
+    - resistance_break / support_break: price crosses the nearest level of
+      the buffered TRIGGER_LEVEL_INTERVAL candles (no extra requests)
+    - sharp_move: price moved TRIGGER_MOVE_PERCENT within TRIGGER_MOVE_BARS bars
+
+    Conditions firing within TRIGGER_DEBOUNCE seconds are merged into one
+    analysis; a coin is not re-triggered for TRIGGER_COOLDOWN seconds, nor
+    while it is in its post-signal cooldown.
+    """
+
+    def __init__(self, analyzer, on_trigger: Callable[[str, List[str]], Awaitable[None]],
+                 cooldowns: CooldownTracker, coins: List[str] = ()):
+        self.analyzer = analyzer
+        self.on_trigger = on_trigger
+        self.cooldowns = cooldowns
+        self.coins = list(coins)
+        self.feeds: Dict[str, _CoinFeed] = {}
+        self.pending: Dict[str, Set[str]] = {}
+        self.last_fired: Dict[str, float] = {}
+        self.fired = 0
+        self._semaphore = asyncio.Semaphore(TRIGGER_CONCURRENCY)
+        self._tasks = set()
+        self._ws = None
+
+    def watch(self, coins: List[str]):
+        """Change the watched coins; the stream reconnects with the new list"""
+        if sorted(coins) == sorted(self.coins):
+            return
+        self.coins = list(coins)
+        if self._ws is not None:
+            asyncio.ensure_future(self._ws.close())
+
+    async def run(self):
+        """Follow the stream until cancelled, reconnecting with backoff"""
+        delay = 1
+        while True:
+            if not self.coins:
+                await asyncio.sleep(5)
+                continue
+
+            streams = '/'.join(f"{coin.lower()}@kline_{TRIGGER_INTERVAL}" for coin in self.coins)
+            try:
+                await self.seed()
+                session = await self.analyzer.get_session()
+                async with session.ws_connect(f"{BINANCE_WS_BASE}?streams={streams}", heartbeat=30) as ws:
+                    self._ws = ws
+                    delay = 1
+                    logger.info("Watching live %s klines of %d coins", TRIGGER_INTERVAL, len(self.coins))
+                    async for message in ws:
+                        if message.type != aiohttp.WSMsgType.TEXT:
+                            break
+                        kline = message.json().get('data', {}).get('k')
+                        if kline:
+                            self.on_kline(kline)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                logger.warning("Kline stream error: %s", e)
+            finally:
+                self._ws = None
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60)
+
+    async def stop(self):
+        for task in list(self._tasks):
+            task.cancel()
+        if self._ws is not None:
+            await self._ws.close()
+
+    async def seed(self):
+        """Closed-bar history of coins seen for the first time, one request each"""
+        for coin in self.coins:
+            if coin in self.feeds:
+                continue
+            feed = self.feeds[coin] = _CoinFeed()
+            candles = await self.analyzer.get_klines(coin, TRIGGER_INTERVAL, TRIGGER_VOLUME_BARS + 1)
+            for candle in candles[:-1]:
+                feed.volumes.append(candle['volume'])
+                feed.closes.append(candle['close'])
+
+    def on_kline(self, kline: Dict):
+        coin = kline['s']
+        feed = self.feeds.get(coin)
+        if feed is None:
+            return
+
+        price, volume = float(kline['c']), float(kline['v'])
+        reasons = self.check(coin, feed, price, volume)
+        feed.price = price
+
+        if kline['x']:
+            feed.volumes.append(volume)
+            feed.closes.append(price)
+
+        if reasons:
+            self.fire(coin, reasons)
+
+    def check(self, coin: str, feed: _CoinFeed, price: float, volume: float) -> List[str]:
+        """Conditions the update meets"""
+        reasons = []
+
+        if len(feed.volumes) == feed.volumes.maxlen:
+            average = sum(feed.volumes) / len(feed.volumes)
+            if average > 0 and volume > average * VOLUME_SPIKE_THRESHOLD:
+                reasons.append('volume')
+
+        levels = self.levels(coin, feed)
+        if levels and feed.price is not None:
+            if feed.price <= levels['resistance'] < price:
+                reasons.append('resistance_break')
+            elif feed.price >= levels['support'] > price:
+                reasons.append('support_break')
+
+        if feed.closes:
+            move = abs(price / feed.closes[0] - 1) * 100
+            if move >= TRIGGER_MOVE_PERCENT:
+                reasons.append('sharp_move')
+
+        return reasons
+
+    def levels(self, coin: str, feed: _CoinFeed) -> Optional[Dict]:
+        """Nearest support/resistance of the buffered candles, recomputed when the buffer moves"""
+        candles = self.analyzer.candle_cache.peek((coin, TRIGGER_LEVEL_INTERVAL))
+        if not candles or len(candles) < 51:
+            return None
+
+        if feed.levels_bar != candles[-1]['time']:
+            # Closed bars only; the buffered forming bar is stale between scans
+            feed.levels = self.analyzer.find_support_resistance(candles[:-1])
+            feed.levels_bar = candles[-1]['time']
+        return feed.levels
+
+    def fire(self, coin: str, reasons: List[str]):
+        if coin in self.pending:
+            self.pending[coin].update(reasons)
+            return
+        if time.monotonic() - self.last_fired.get(coin, float('-inf')) < TRIGGER_COOLDOWN:
+            return
+        if self.cooldowns.is_cooling(coin):
+            return
+
+        self.pending[coin] = set(reasons)
+        task = asyncio.create_task(self.dispatch(coin))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def dispatch(self, coin: str):
+        # Let conditions of the same move arrive, then analyze once
+        await asyncio.sleep(TRIGGER_DEBOUNCE)
+        reasons = sorted(self.pending.pop(coin))
+        self.last_fired[coin] = time.monotonic()
+        self.fired += 1
+
+        async with self._semaphore:
+            try:
+                await self.on_trigger(coin, reasons)
+            except Exception as e:
+                logger.error("Error handling trigger for %s: %s", coin, e)
@@ -0,0 +1,172 @@
+# indicators.py - Technical Indicators
+#
+# Each indicator is a small state object with update() for incremental use,
+# and a function that runs it over a whole series in a single pass. Values
+# are None until the indicator has seen enough data.
+import math
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+class EMA:
+    """Exponential moving average, seeded with the SMA of the first `period` values"""
+
+    def __init__(self, period: int):
+        self.period = period
+        self.alpha = 2 / (period + 1)
+        self.value: Optional[float] = None
+        self._count = 0
+        self._seed = 0.0
+
+    def update(self, x: float) -> Optional[float]:
+        if self.value is not None:
+            self.value += self.alpha * (x - self.value)
+            return self.value
+
+        self._count += 1
+        self._seed += x
+        if self._count == self.period:
+            self.value = self._seed / self.period
+        return self.value
+
+class RSI:
+    """Relative strength index with Wilder smoothing"""
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.value: Optional[float] = None
+        self._prev: Optional[float] = None
+        self._count = 0
+        self._gain = 0.0
+        self._loss = 0.0
+
+    def update(self, close: float) -> Optional[float]:
+        if self._prev is None:
+            self._prev = close
+            return None
+
+        change = close - self._prev
+        self._prev = close
+        gain = change if change > 0 else 0.0
+        loss = -change if change < 0 else 0.0
+
+        if self._count < self.period:
+            self._count += 1
+            self._gain += gain
+            self._loss += loss
+            if self._count < self.period:
+                return None
+            self._gain /= self.period
+            self._loss /= self.period
+        else:
+            self._gain = (self._gain * (self.period - 1) + gain) / self.period
+            self._loss = (self._loss * (self.period - 1) + loss) / self.period
+
+        if self._loss == 0:
+            self.value = 100.0
+        else:
+            self.value = 100 - 100 / (1 + self._gain / self._loss)
+        return self.value
+
+class ATR:
+    """Average true range with Wilder smoothing"""
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.value: Optional[float] = None
+        self._prev_close: Optional[float] = None
+        self._count = 0
+        self._sum = 0.0
+
+    def update(self, high: float, low: float, close: float) -> Optional[float]:
+        if self._prev_close is None:
+            true_range = high - low
+        else:
+            true_range = max(high - low, abs(high - self._prev_close), abs(low - self._prev_close))
+        self._prev_close = close
+
+        if self.value is not None:
+            self.value = (self.value * (self.period - 1) + true_range) / self.period
+            return self.value
+
+        self._count += 1
+        self._sum += true_range
+        if self._count == self.period:
+            self.value = self._sum / self.period
+        return self.value
+
+class MACD:
+    """MACD line, signal line and histogram"""
+
+    def __init__(self, fast: int = 12, slow: int = 26, signal: int = 9):
+        self._fast = EMA(fast)
+        self._slow = EMA(slow)
+        self._signal = EMA(signal)
+        self.value: Tuple[Optional[float], Optional[float], Optional[float]] = (None, None, None)
+
+    def update(self, close: float) -> Tuple[Optional[float], Optional[float], Optional[float]]:
+        fast = self._fast.update(close)
+        slow = self._slow.update(close)
+        if fast is None or slow is None:
+            return self.value
+
+        line = fast - slow
+        signal = self._signal.update(line)
+        self.value = (line, signal, None if signal is None else line - signal)
+        return self.value
+
+class Bollinger:
+    """Bollinger Bands (middle, upper, lower) from running sums over a window"""
+
+    def __init__(self, period: int = 20, width: float = 2.0):
+        self.period = period
+        self.width = width
+        self.value: Tuple[Optional[float], Optional[float], Optional[float]] = (None, None, None)
+        self._window = deque()
+        self._shift: Optional[float] = None
+        self._sum = 0.0
+        self._sum_sq = 0.0
+
+    def update(self, close: float) -> Tuple[Optional[float], Optional[float], Optional[float]]:
+        # Sums of (x - shift) avoid cancellation in the variance at large prices
+        if self._shift is None:
+            self._shift = close
+        x = close - self._shift
+
+        self._window.append(x)
+        self._sum += x
+        self._sum_sq += x * x
+        if len(self._window) > self.period:
+            old = self._window.popleft()
+            self._sum -= old
+            self._sum_sq -= old * old
+        if len(self._window) < self.period:
+            return self.value
+
+        mean = self._sum / self.period
+        deviation = math.sqrt(max(0.0, self._sum_sq / self.period - mean * mean))
+        middle = self._shift + mean
+        self.value = (middle, middle + self.width * deviation, middle - self.width * deviation)
+        return self.value
+
+# Whole-series versions (single pass)
+def ema(values: List[float], period: int) -> List[Optional[float]]:
+    state = EMA(period)
+    return [state.update(x) for x in values]
+
+def rsi(closes: List[float], period: int = 14) -> List[Optional[float]]:
+    state = RSI(period)
+    return [state.update(x) for x in closes]
+
+def atr(candles: List[Dict], period: int = 14) -> List[Optional[float]]:
+    state = ATR(period)
+    return [state.update(c['high'], c['low'], c['close']) for c in candles]
+
+def macd(closes: List[float], fast: int = 12, slow: int = 26,
+         signal: int = 9) -> List[Tuple[Optional[float], Optional[float], Optional[float]]]:
+    state = MACD(fast, slow, signal)
+    return [state.update(x) for x in closes]
+
+def bollinger(closes: List[float], period: int = 20,
+              width: float = 2.0) -> List[Tuple[Optional[float], Optional[float], Optional[float]]]:
+    state = Bollinger(period, width)
+    return [state.update(x) for x in closes]
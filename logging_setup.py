@@ -0,0 +1,150 @@
+# logging_setup.py - Queue-based Structured Logging
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
+
+from config import LOG_LEVEL, LOG_FORMAT
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Ids of the scan cycle / signal being processed, attached to every record
+scan_id_var: ContextVar[Optional[str]] = ContextVar('scan_id', default=None)
+signal_id_var: ContextVar[Optional[int]] = ContextVar('signal_id', default=None)
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+@contextmanager
+def log_context(scan_id: str = None, signal_id: int = None):
+    """Tag the records logged inside the block (and the tasks it starts) with ids"""
+    tokens = []
+    if scan_id is not None:
+        tokens.append((scan_id_var, scan_id_var.set(scan_id)))
+    if signal_id is not None:
+        tokens.append((signal_id_var, signal_id_var.set(signal_id)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+class DeliveryReport:
+    """Per-recipient outcomes of one broadcast, logged as a single summary record"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.sent = 0
+        self.deactivated = 0
+        self.failures = Counter()
+        self.examples = {}
+
+    def success(self):
+        self.sent += 1
+
+    def blocked(self):
+        self.deactivated += 1
+
+    def failure(self, user_id: int, error: Exception):
+        kind = type(error).__name__
+        self.failures[kind] += 1
+        self.examples.setdefault(kind, f"{user_id}: {error}")
+
+    @property
+    def failed(self) -> int:
+        return self.deactivated + sum(self.failures.values())
+
+    def log(self, logger: logging.Logger):
+        level = logging.WARNING if self.failures else logging.INFO
+        if not logger.isEnabledFor(level):
+            return
+
+        data = {
+            'broadcast': self.name, 'sent': self.sent, 'deactivated': self.deactivated,
+            'failures': dict(self.failures), 'examples': self.examples
+        }
+        logger.log(level, "Broadcast %s: %d sent, %d deactivated, %d failed %s",
+                   self.name, self.sent, self.deactivated, sum(self.failures.values()),
+                   dict(self.failures) or '', extra={'data': data})
+
+class ContextFilter(logging.Filter):
+    """Copies the context ids onto the record in the thread that logged it"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.scan_id = scan_id_var.get()
+        record.signal_id = signal_id_var.get()
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; fields passed as ``extra={'data': {...}}`` are merged in"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        for field in ('scan_id', 'signal_id'):
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        entry.update(getattr(record, 'data', None) or {})
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class _ContextTextFormatter(logging.Formatter):
+    """Text format with the context ids appended when set"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        ids = [f"{field}={getattr(record, field)}" for field in ('scan_id', 'signal_id')
+               if getattr(record, field, None) is not None]
+        return f"{text} [{' '.join(ids)}]" if ids else text
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge args now (they may change once the call returns); formatting,
+        # tracebacks included, is left to the listener thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+def setup_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT):
+    """Route all records through a queue to a handler on a background thread.
+
+    Loggers only enqueue records, so a burst of log lines (a large
+    broadcast, a full scan) never waits on stderr I/O in the event loop.
+    """
+    global _listener
+    if _listener:
+        return
+
+    output = logging.StreamHandler()
+    output.setFormatter(JsonFormatter() if fmt == 'json' else _ContextTextFormatter(TEXT_FORMAT))
+
+    handler = _QueueHandler(queue.SimpleQueue())
+    handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level.upper())
+
+    _listener = logging.handlers.QueueListener(handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+def stop_logging():
+    """Flush the queue and stop the background thread"""
+    global _listener
+    if _listener:
+        _listener.stop()
+        _listener = None
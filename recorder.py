@@ -0,0 +1,177 @@
+# recorder.py - Record and Replay of External Traffic
+#
+# RECORD_MODE=record appends every Binance and Telegram exchange to a gzip
+# JSON-lines file; RECORD_MODE=replay answers the same calls from that file
+# instead of the network, so an incident can be re-run on the exact data.
+import asyncio
+import atexit
+import gzip
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Dict, Optional, Tuple
+
+from telegram.request import HTTPXRequest, RequestData
+
+from config import RECORD_MODE, RECORD_FILE, REPLAY_SPEED, DATABASE_FILE, REPLAY_DATABASE_FILE
+
+logger = logging.getLogger(__name__)
+
+class ReplayMiss(KeyError):
+    """A replayed call has no (more) recorded responses"""
+
+class TrafficRecorder:
+    """Append-only gzip log of request/response pairs.
+
+    ``record`` only enqueues; compression and file I/O run on a background
+    thread. Each batch is sync-flushed, so a crash loses at most the batch
+    being written and the file stays readable up to it.
+    """
+
+    def __init__(self, path: str = RECORD_FILE):
+        self.path = path
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._write_loop, name='traffic-recorder', daemon=True)
+        self._thread.start()
+
+    def record(self, kind: str, key: str, started: float, elapsed: float,
+               status: int, body, params: Dict = None):
+        self._queue.put({
+            't': started, 'ms': round(elapsed * 1000, 2), 'kind': kind, 'key': key,
+            'params': params, 'status': status, 'body': body
+        })
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _write_loop(self):
+        with gzip.open(self.path, 'ab') as f:
+            while True:
+                entries = [self._queue.get()]
+                while not self._queue.empty():
+                    entries.append(self._queue.get())
+
+                stop = None in entries
+                lines = [json.dumps(entry, separators=(',', ':'), default=str)
+                         for entry in entries if entry is not None]
+                if lines:
+                    f.write(('\n'.join(lines) + '\n').encode())
+                    f.flush()
+                if stop:
+                    return
+
+class TrafficReplayer:
+    """Serves recorded responses back in recording order, per call key.
+
+    ``speed`` scales the recorded latency of each call: 1 replays at the
+    original speed, 0 as fast as possible. ``clock()`` is the recorded time
+    the last served call returned, so time-dependent logic sees recording time.
+    """
+
+    def __init__(self, path: str = RECORD_FILE, speed: float = REPLAY_SPEED):
+        self.speed = speed
+        self.responses: Dict[Tuple[str, str], deque] = defaultdict(deque)
+        self._clock: Optional[float] = None
+
+        count = 0
+        with gzip.open(path, 'rt') as f:
+            try:
+                for line in f:
+                    entry = json.loads(line)
+                    self.responses[(entry['kind'], entry['key'])].append(entry)
+                    count += 1
+            except (EOFError, OSError, json.JSONDecodeError):
+                # Tail of a recording cut off mid-write
+                pass
+        logger.info("Loaded %d recorded calls from %s", count, path)
+
+    async def respond(self, kind: str, key: str) -> Tuple[int, object]:
+        """(status, body) of the next recorded call with this key"""
+        pending = self.responses.get((kind, key))
+        if not pending:
+            raise ReplayMiss(f"No recorded {kind} response for {key}")
+
+        entry = pending.popleft()
+        if self.speed > 0:
+            await asyncio.sleep(entry['ms'] / 1000 * self.speed)
+        self._clock = entry['t'] + entry['ms'] / 1000
+        return entry['status'], entry['body']
+
+    def clock(self) -> float:
+        return time.time() if self._clock is None else self._clock
+
+class RecordingRequest(HTTPXRequest):
+    """Telegram request backend that records every call, or replays them.
+
+    Calls are keyed by Bot API method; responses are stored as JSON text.
+    """
+
+    def __init__(self, recorder: TrafficRecorder = None, replayer: TrafficReplayer = None, **kwargs):
+        super().__init__(**kwargs)
+        self.recorder = recorder
+        self.replayer = replayer
+
+    async def do_request(self, url: str, method: str, request_data: RequestData = None, **kwargs) -> Tuple[int, bytes]:
+        endpoint = url.rsplit('/', 1)[-1]
+
+        if self.replayer:
+            try:
+                status, body = await self.replayer.respond('telegram', endpoint)
+            except ReplayMiss:
+                if endpoint != 'getUpdates':
+                    raise
+                # Recorded updates are used up: poll on as if nothing arrives
+                await asyncio.sleep(1)
+                status, body = 200, '{"ok":true,"result":[]}'
+            return status, body.encode()
+
+        started = time.time()
+        status, payload = await super().do_request(url, method, request_data, **kwargs)
+        if self.recorder:
+            self.recorder.record('telegram', endpoint, started, time.time() - started, status,
+                                 payload.decode(errors='replace'),
+                                 request_data.json_parameters if request_data else None)
+        return status, payload
+
+def prepare_replay_database(source: str = DATABASE_FILE, target: str = REPLAY_DATABASE_FILE) -> str:
+    """Fresh scratch copy of the database for a replay run to write to"""
+    for path in (target, f"{target}-wal", f"{target}-shm"):
+        if os.path.exists(path):
+            os.remove(path)
+
+    if os.path.exists(source):
+        # The backup API copies a consistent state even while WAL frames are pending
+        src = sqlite3.connect(f"file:{source}?mode=ro", uri=True)
+        dst = sqlite3.connect(target)
+        try:
+            src.backup(dst)
+        finally:
+            dst.close()
+            src.close()
+    logger.info("Replaying against scratch database %s", target)
+    return target
+
+_recorder: Optional[TrafficRecorder] = None
+_replayer: Optional[TrafficReplayer] = None
+
+def get_recorder() -> Optional[TrafficRecorder]:
+    """Process-wide recorder when RECORD_MODE=record, else None"""
+    global _recorder
+    if RECORD_MODE == 'record' and _recorder is None:
+        _recorder = TrafficRecorder()
+        atexit.register(_recorder.close)
+        logger.info("Recording external traffic to %s", RECORD_FILE)
+    return _recorder
+
+def get_replayer() -> Optional[TrafficReplayer]:
+    """Process-wide replayer when RECORD_MODE=replay, else None"""
+    global _replayer
+    if RECORD_MODE == 'replay' and _replayer is None:
+        _replayer = TrafficReplayer()
+    return _replayer
@@ -0,0 +1,99 @@
+# roster.py - In-memory User/Admin Roster
+import threading
+from typing import Iterable, List, Tuple
+
+class Roster:
+    """In-memory mirror of the users and admins tables.
+
+    Loaded once from the database and kept current by write-through from
+    ``Database``, so membership checks never touch SQLite.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._users = set()
+        self._blocked = set()
+        self._inactive = set()
+        self._admins = set()
+        self._active_snapshot = None
+
+    def load(self, users: Iterable[Tuple[int, bool, bool]], admins: Iterable[int]):
+        """Load (user_id, is_blocked, is_active) rows and admin ids"""
+        with self._lock:
+            self._users.clear()
+            self._blocked.clear()
+            self._inactive.clear()
+            for user_id, is_blocked, is_active in users:
+                self._users.add(user_id)
+                if is_blocked:
+                    self._blocked.add(user_id)
+                if not is_active:
+                    self._inactive.add(user_id)
+
+            self._admins = set(admins)
+            self._active_snapshot = None
+
+    # Write-through updates
+    def add_user(self, user_id: int):
+        with self._lock:
+            self._users.add(user_id)
+            self._inactive.discard(user_id)
+            self._active_snapshot = None
+
+    def set_blocked(self, user_id: int, blocked: bool):
+        with self._lock:
+            if user_id not in self._users:
+                return
+            if blocked:
+                self._blocked.add(user_id)
+            else:
+                self._blocked.discard(user_id)
+            self._active_snapshot = None
+
+    def set_active(self, user_id: int, active: bool):
+        with self._lock:
+            if active:
+                self._inactive.discard(user_id)
+            else:
+                self._inactive.add(user_id)
+            self._active_snapshot = None
+
+    def remove_user(self, user_id: int):
+        with self._lock:
+            self._users.discard(user_id)
+            self._blocked.discard(user_id)
+            self._inactive.discard(user_id)
+            self._active_snapshot = None
+
+    def add_admin(self, admin_id: int):
+        with self._lock:
+            self._admins.add(admin_id)
+
+    def remove_admin(self, admin_id: int):
+        with self._lock:
+            self._admins.discard(admin_id)
+
+    # Lookups
+    def is_blocked(self, user_id: int) -> bool:
+        return user_id in self._blocked
+
+    def is_active(self, user_id: int) -> bool:
+        return (user_id in self._users and user_id not in self._blocked
+                and user_id not in self._inactive)
+
+    def is_admin(self, user_id: int) -> bool:
+        return user_id in self._admins
+
+    def admins(self) -> List[int]:
+        with self._lock:
+            return list(self._admins)
+
+    def active_users(self) -> List[int]:
+        """Active (not blocked) users; the list is cached until the roster changes"""
+        with self._lock:
+            if self._active_snapshot is None:
+                self._active_snapshot = [
+                    user_id for user_id in self._users
+                    if user_id not in self._blocked and user_id not in self._inactive
+                ]
+            return list(self._active_snapshot)
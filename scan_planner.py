@@ -0,0 +1,188 @@
+# scan_planner.py - Coin Cooldowns and Scan Planning
+import asyncio
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from config import TOP_COINS, SCAN_INTERVALS, ANALYSIS_COOLDOWN, SCAN_BUDGET, MIN_CONFIDENCE
+
+logger = logging.getLogger(__name__)
+
+def priority_score(candles: List[Dict]) -> Optional[float]:
+    """How promising a coin looks from its buffered candles, without any request.
+
+    Volatility (mean true range over the last 14 bars, % of price), scaled up
+    by a volume surge on the last closed bar and by the price's proximity to
+    the high or low of the window.
+    """
+    if len(candles) < 22:
+        return None
+
+    price = candles[-1]['close']
+    recent = candles[-15:]
+    true_ranges = [max(c['high'], p['close']) - min(c['low'], p['close']) for p, c in zip(recent, recent[1:])]
+    volatility = sum(true_ranges) / len(true_ranges) / price * 100
+
+    volumes = [c['volume'] for c in candles[-22:-2]]
+    average_volume = sum(volumes) / len(volumes)
+    surge = candles[-2]['volume'] / average_volume if average_volume > 0 else 1.0
+
+    high = max(c['high'] for c in candles[-50:])
+    low = min(c['low'] for c in candles[-50:])
+    half_range = (high - low) / 2
+    proximity = 1 - min(high - price, price - low) / half_range if half_range > 0 else 0.0
+
+    return volatility * (1 + min(surge, 5.0)) * (1 + max(0.0, proximity))
+
+class CooldownTracker:
+    """In-memory mirror of the analyzed_coins table.
+
+    Holds the last analysis time of each coin as a UTC epoch, so cooldown
+    checks are a dict lookup instead of a database round-trip.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._analyzed_at: Dict[str, float] = {}
+
+    def load(self, rows: Iterable[Tuple[str, float]]):
+        """Load (coin, last analysis epoch) rows"""
+        with self._lock:
+            self._analyzed_at = dict(rows)
+
+    def mark(self, coin: str, analyzed_at: float = None) -> float:
+        """Start a coin's cooldown; returns the analysis time"""
+        analyzed_at = time.time() if analyzed_at is None else analyzed_at
+        with self._lock:
+            self._analyzed_at[coin] = analyzed_at
+        return analyzed_at
+
+    def snapshot(self) -> Dict[str, float]:
+        """Copy of every coin's last analysis time"""
+        with self._lock:
+            return dict(self._analyzed_at)
+
+    def is_cooling(self, coin: str, cooldown_minutes: int = ANALYSIS_COOLDOWN,
+                   now: float = None) -> bool:
+        analyzed_at = self._analyzed_at.get(coin)
+        if analyzed_at is None:
+            return False
+        now = time.time() if now is None else now
+        return now - analyzed_at < cooldown_minutes * 60
+
+    def remaining(self, coin: str, cooldown_minutes: int = ANALYSIS_COOLDOWN,
+                  now: float = None) -> float:
+        """Seconds left in a coin's cooldown (0 when eligible)"""
+        analyzed_at = self._analyzed_at.get(coin)
+        if analyzed_at is None:
+            return 0.0
+        now = time.time() if now is None else now
+        return max(0.0, analyzed_at + cooldown_minutes * 60 - now)
+
+    def eligible(self, coins: Iterable[str], cooldown_minutes: int = ANALYSIS_COOLDOWN,
+                 now: float = None) -> List[str]:
+        """Coins out of cooldown, in the given order"""
+        now = time.time() if now is None else now
+        cutoff = now - cooldown_minutes * 60
+        with self._lock:
+            analyzed_at = self._analyzed_at
+            return [coin for coin in coins if analyzed_at.get(coin, cutoff) <= cutoff]
+
+class ScanPlanner:
+    """Decides when to scan and which coins a scan cycle analyzes, in which order.
+
+    A cycle analyzes coins most promising first and stops at its time budget.
+    Coins it did not reach are carried over: each cycle a coin waits multiplies
+    its priority, so low-priority coins are delayed under load but never starve.
+    """
+
+    def __init__(self, cooldowns: CooldownTracker, coins: List[str] = TOP_COINS,
+                 scan_minutes: List[int] = SCAN_INTERVALS,
+                 cooldown_minutes: int = ANALYSIS_COOLDOWN, budget: float = SCAN_BUDGET):
+        self.cooldowns = cooldowns
+        self.coins = list(coins)
+        self.scan_minutes = set(scan_minutes)
+        self.cooldown_minutes = cooldown_minutes
+        self.budget = budget
+        self.carried: Dict[str, int] = {}
+        self.coverage: Dict = {}
+
+    def is_scan_time(self, now: datetime = None) -> bool:
+        return (now or datetime.now()).minute in self.scan_minutes
+
+    def cycle_start(self, now: datetime = None) -> datetime:
+        """Start of the scan cycle ``now`` falls in (the last scan minute at or before it)"""
+        now = (now or datetime.now()).replace(second=0, microsecond=0)
+        for back in range(60):
+            start = now - timedelta(minutes=back)
+            if start.minute in self.scan_minutes:
+                return start
+        return now
+
+    def plan_scan(self, now: float = None, scores: Dict[str, Optional[float]] = None) -> List[str]:
+        """Coins to analyze this cycle, highest priority first; coins in cooldown are left out up front"""
+        coins = self.cooldowns.eligible(self.coins, self.cooldown_minutes, now)
+        if scores is None:
+            return coins
+
+        # Coins without buffered data yet have no score and go first
+        def priority(coin: str) -> float:
+            score = scores.get(coin)
+            if score is None:
+                return float('inf')
+            return score * (1 + self.carried.get(coin, 0))
+
+        return sorted(coins, key=priority, reverse=True)
+
+    def finish_scan(self, planned: List[str], analyzed: int, elapsed: float) -> Dict:
+        """Carry the coins a cycle did not reach over to the next one and record coverage"""
+        for coin in planned[:analyzed]:
+            self.carried.pop(coin, None)
+        for coin in planned[analyzed:]:
+            self.carried[coin] = self.carried.get(coin, 0) + 1
+
+        self.coverage = {
+            'analyzed': analyzed,
+            'eligible': len(planned),
+            'carried': len(planned) - analyzed,
+            'elapsed': round(elapsed, 1)
+        }
+        logger.info("Scan coverage: %d/%d eligible coins in %.0fs, %d carried over",
+                    analyzed, len(planned), elapsed, len(planned) - analyzed,
+                    extra={'data': {'coverage': self.coverage}})
+        return self.coverage
+
+    async def run_scan(self, analyze: Callable[[str], Awaitable[Dict]],
+                       scores: Dict[str, Optional[float]] = None, pause: float = 2,
+                       on_candidate: Callable[[Dict], None] = None) -> List[Dict]:
+        """Analyze this cycle's coins in priority order until the budget runs out.
+
+        Returns the analyses that reached MIN_CONFIDENCE; ``on_candidate`` is
+        called with each of them as soon as it is found.
+        """
+        planned = self.plan_scan(scores=scores)
+        started = time.monotonic()
+        deadline = started + self.budget
+
+        candidates = []
+        analyzed = 0
+        for coin in planned:
+            if time.monotonic() >= deadline:
+                break
+
+            try:
+                analysis = await analyze(coin)
+                if analysis['confidence'] >= MIN_CONFIDENCE:
+                    candidates.append(analysis)
+                    if on_candidate:
+                        on_candidate(analysis)
+            except Exception as e:
+                logger.error("Error analyzing %s: %s", coin, e)
+            analyzed += 1
+
+            await asyncio.sleep(pause)  # Small delay between coins
+
+        self.finish_scan(planned, analyzed, time.monotonic() - started)
+        return candidates
@@ -1,24 +1,29 @@
 # signal_manager.py - Signal Management
 import logging
-from typing import Dict
-from datetime import datetime
+from bisect import bisect_left, bisect_right
+from typing import Dict, List
+from datetime import datetime, timezone
 
-from config import ANALYSIS_COOLDOWN
+from config import ANALYSIS_COOLDOWN, INTRABAR_TIE_POLICY
+from database import SQLITE_TIME_FORMAT
+from triggers import TriggerIndex
 
 logger = logging.getLogger(__name__)
 
 class SignalManager:
-    def __init__(self, db):
+    def __init__(self, db, tie_policy: str = INTRABAR_TIE_POLICY):
         self.db = db
+        self.tie_policy = tie_policy
+        self.triggers = TriggerIndex()
     
-    def was_recently_analyzed(self, coin: str) -> bool:
+    async def was_recently_analyzed(self, coin: str) -> bool:
         """Check if coin was analyzed recently (within cooldown period)"""
-        return self.db.was_recently_analyzed(coin, ANALYSIS_COOLDOWN)
+        return await self.db.was_recently_analyzed(coin, ANALYSIS_COOLDOWN)
     
-    def mark_as_analyzed(self, coin: str):
+    async def mark_as_analyzed(self, coin: str):
         """Mark coin as analyzed"""
-        self.db.mark_coin_analyzed(coin)
-        logger.info(f"{coin} marked as analyzed - cooldown for {ANALYSIS_COOLDOWN} minutes")
+        await self.db.mark_coin_analyzed(coin)
+        logger.info("%s marked as analyzed - cooldown for %d minutes", coin, ANALYSIS_COOLDOWN)
     
     def check_take_profit(self, signal: Dict, current_price: float) -> bool:
         """Check if any take profit level is hit"""
@@ -29,14 +34,14 @@ class SignalManager:
             # For LONG, price should go UP to hit TP
             for tp in take_profits:
                 if current_price >= tp:
-                    logger.info(f"{signal['coin']}: TP hit at {current_price} (TP: {tp})")
+                    logger.info("%s: TP hit at %s (TP: %s)", signal['coin'], current_price, tp)
                     return True
         
         else:  # SHORT
             # For SHORT, price should go DOWN to hit TP
             for tp in take_profits:
                 if current_price <= tp:
-                    logger.info(f"{signal['coin']}: TP hit at {current_price} (TP: {tp})")
+                    logger.info("%s: TP hit at %s (TP: %s)", signal['coin'], current_price, tp)
                     return True
         
         return False
@@ -49,17 +54,148 @@ class SignalManager:
         if direction == 'LONG':
             # For LONG, SL is below entry
             if current_price <= stop_loss:
-                logger.info(f"{signal['coin']}: SL hit at {current_price} (SL: {stop_loss})")
+                logger.info("%s: SL hit at %s (SL: %s)", signal['coin'], current_price, stop_loss)
                 return True
         
         else:  # SHORT
             # For SHORT, SL is above entry
             if current_price >= stop_loss:
-                logger.info(f"{signal['coin']}: SL hit at {current_price} (SL: {stop_loss})")
+                logger.info("%s: SL hit at %s (SL: %s)", signal['coin'], current_price, stop_loss)
                 return True
         
         return False
     
+    def checked_from(self, signal: Dict) -> int:
+        """Open time (ms) of the first candle not yet checked for a signal"""
+        if signal.get('last_checked'):
+            return signal['last_checked'] + 1
+        
+        # Candles from the first one opening after the signal was sent
+        sent = datetime.strptime(signal['sent_time'], SQLITE_TIME_FORMAT).replace(tzinfo=timezone.utc)
+        return int(sent.timestamp() * 1000)
+    
+    def resolve_candles(self, coin: str, signals: List[Dict], candles: List[Dict]) -> Dict[int, Dict]:
+        """First TP/SL hit of each signal on a coin within closed candles, in time order.
+        
+        Returns {signal_id: outcome} for the signals that closed; an outcome has
+        status ('completed'/'stopped'), exit_price, tp_level and the candle time.
+        Untouched signals stay registered in the trigger index for the next check.
+        """
+        book = self.triggers.book(coin)
+        first_time = candles[0]['time']
+        
+        # Signals only join the index from their first unchecked candle
+        current = {signal['id']: signal for signal in signals}
+        for signal_id in book.signal_ids():
+            signal = current.get(signal_id)
+            if signal is None or self.checked_from(signal) > first_time:
+                book.remove(signal_id)
+        
+        pending = sorted((self.checked_from(signal), signal['id'], signal)
+                         for signal in signals if signal['id'] not in book)
+        pending.reverse()
+        
+        outcomes = {}
+        for candle in candles:
+            while pending and pending[-1][0] <= candle['time']:
+                book.add(pending.pop()[2])
+            
+            hits = book.cross(candle['high'], candle['low'])
+            if not hits:
+                continue
+            
+            tp_hits = {hit.signal_id for hit in hits if hit.kind == 'tp'}
+            sl_hits = {hit.signal_id for hit in hits if hit.kind == 'sl'}
+            for signal_id in tp_hits | sl_hits:
+                signal = book.signal(signal_id)
+                is_long = signal['direction'] == 'LONG'
+                
+                tp_level = 0
+                if signal_id in tp_hits:
+                    tp_level = book.advance_through(signal_id, candle['high'] if is_long else candle['low'])
+                
+                outcomes[signal_id] = self.candle_outcome(signal, candle, tp_level,
+                                                          signal_id in sl_hits)
+                book.remove(signal_id)
+        
+        return outcomes
+    
+    def adverse_moves(self, signals: List[Dict], candles: List[Dict],
+                      outcomes: Dict[int, Dict]) -> Dict[int, float]:
+        """Largest move against each signal (% of entry) within its unchecked candles.
+        
+        A closed signal is measured up to its outcome candle. Suffix extremes
+        make the common case, a still open signal, one lookup per signal.
+        """
+        times = [candle['time'] for candle in candles]
+        suffix_low = [0.0] * len(candles)
+        suffix_high = [0.0] * len(candles)
+        low, high = float('inf'), float('-inf')
+        for i in range(len(candles) - 1, -1, -1):
+            low = min(low, candles[i]['low'])
+            high = max(high, candles[i]['high'])
+            suffix_low[i], suffix_high[i] = low, high
+        
+        moves = {}
+        for signal in signals:
+            start = bisect_left(times, self.checked_from(signal))
+            if start >= len(candles):
+                continue
+            
+            outcome = outcomes.get(signal['id'])
+            if outcome is None:
+                low, high = suffix_low[start], suffix_high[start]
+            else:
+                end = bisect_right(times, outcome['time'])
+                window = candles[start:end]
+                low = min(candle['low'] for candle in window)
+                high = max(candle['high'] for candle in window)
+            
+            entry = signal['entry']
+            if signal['direction'] == 'LONG':
+                move = (entry - low) / entry * 100
+            else:
+                move = (high - entry) / entry * 100
+            moves[signal['id']] = max(0.0, move)
+        
+        return moves
+    
+    def candle_outcome(self, signal: Dict, candle: Dict, tp_level: int, sl_hit: bool) -> Dict:
+        """Outcome of a candle that touched the signal's TP (tp_level > 0) and/or SL"""
+        is_long = signal['direction'] == 'LONG'
+        stop_loss = signal['stop_loss']
+        
+        if tp_level and sl_hit:
+            sl_hit = self.stop_loss_first(signal, candle)
+        
+        if sl_hit:
+            # A stop fills at the open when the candle gaps through it
+            if is_long:
+                exit_price = min(candle['open'], stop_loss)
+            else:
+                exit_price = max(candle['open'], stop_loss)
+            
+            logger.info("%s: SL hit in candle %s (SL: %s)", signal['coin'], candle['time'], stop_loss)
+            return {'status': 'stopped', 'exit_price': exit_price, 'tp_level': 0,
+                    'time': candle['time']}
+        
+        exit_price = signal['take_profits'][tp_level - 1]
+        logger.info("%s: TP%d hit in candle %s (TP: %s)", signal['coin'], tp_level, candle['time'], exit_price)
+        return {'status': 'completed', 'exit_price': exit_price, 'tp_level': tp_level,
+                'time': candle['time']}
+    
+    def stop_loss_first(self, signal: Dict, candle: Dict) -> bool:
+        """Decide a candle that touched both TP and SL, per the tie policy"""
+        if self.tie_policy == 'tp_first':
+            return False
+        
+        if self.tie_policy == 'ohlc_path':
+            # Bullish candle: open -> low -> high -> close; bearish: open -> high -> low -> close
+            low_first = candle['close'] >= candle['open']
+            return low_first == (signal['direction'] == 'LONG')
+        
+        return True
+    
     def calculate_profit(self, entry: float, exit_price: float, direction: str) -> float:
         """Calculate profit/loss percentage"""
         if direction == 'LONG':
@@ -0,0 +1,65 @@
+# snapshot.py - Runtime State Snapshots
+import gzip
+import json
+import logging
+import os
+import time
+from fractions import Fraction
+from typing import Dict, Optional
+
+from config import SNAPSHOT_FILE
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+
+def _encode(value):
+    if isinstance(value, Fraction):
+        return {'__fraction__': [value.numerator, value.denominator]}
+    raise TypeError(f"Cannot snapshot {type(value).__name__}")
+
+def _decode(obj: Dict):
+    if '__fraction__' in obj:
+        numerator, denominator = obj['__fraction__']
+        return Fraction(numerator, denominator)
+    return obj
+
+class SnapshotStore:
+    """Compact gzip JSON snapshot of in-memory state, replaced atomically.
+
+    save() and load() do blocking file I/O and are meant to run in an
+    executor; callers hand over data that is no longer mutated.
+    """
+
+    def __init__(self, path: str = SNAPSHOT_FILE):
+        self.path = path
+
+    def save(self, state: Dict):
+        payload = {'version': SNAPSHOT_VERSION, 'saved_at': time.time(), 'state': state}
+        data = json.dumps(payload, default=_encode, separators=(',', ':')).encode()
+
+        tmp_path = f"{self.path}.tmp"
+        with gzip.open(tmp_path, 'wb', compresslevel=5) as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+
+        logger.info("Snapshot saved: %d KB", len(data) // 1024)
+
+    def load(self) -> Optional[Dict]:
+        """Saved state, or None when missing, unreadable or from another version"""
+        try:
+            with gzip.open(self.path, 'rb') as f:
+                payload = json.loads(f.read(), object_hook=_decode)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable snapshot %s: %s", self.path, e)
+            return None
+
+        if payload.get('version') != SNAPSHOT_VERSION:
+            logger.warning("Ignoring snapshot version %s", payload.get('version'))
+            return None
+
+        age = time.time() - payload.get('saved_at', 0)
+        logger.info("Snapshot loaded (%.0f minutes old)", age / 60)
+        return payload['state']
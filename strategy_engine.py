@@ -0,0 +1,238 @@
+# strategy_engine.py - Pluggable Strategies over a Shared Indicator Graph
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import indicators
+from config import TIMEFRAMES, TREND_STRENGTH_THRESHOLD, ATR_PERIOD, STRATEGIES as ENABLED_STRATEGIES
+
+# Indicators provided by CryptoAnalyzer.analyze_candles (memoized per closed candle)
+BASE_INDICATORS = ('trend', 'volume', 'levels')
+
+class Indicator(NamedTuple):
+    name: str
+    compute: Callable[[List[Dict], Dict], object]  # (candles, computed values) -> value
+    deps: Tuple[str, ...]
+
+INDICATORS: Dict[str, Indicator] = {}
+STRATEGIES: Dict[str, type] = {}
+
+def register_indicator(name: str, deps: Iterable[str] = ()):
+    """Register ``compute(candles, values)`` as an indicator depending on ``deps``"""
+    def decorator(compute):
+        INDICATORS[name] = Indicator(name, compute, tuple(deps))
+        return compute
+    return decorator
+
+def register_strategy(cls):
+    """Register a Strategy subclass under its ``name``"""
+    STRATEGIES[cls.name] = cls
+    return cls
+
+class IndicatorGraph:
+    """Deduplicated evaluation order for the indicators a set of strategies needs"""
+
+    def __init__(self, names: Iterable[str], provided: Iterable[str] = BASE_INDICATORS):
+        self.provided = set(provided)
+        self.order: List[str] = []
+        visiting = set()
+
+        def visit(name: str):
+            if name in self.provided or name in self.order:
+                return
+            if name in visiting:
+                raise ValueError(f"Indicator dependency cycle at {name}")
+            if name not in INDICATORS:
+                raise ValueError(f"Unknown indicator: {name}")
+
+            visiting.add(name)
+            for dep in INDICATORS[name].deps:
+                visit(dep)
+            visiting.discard(name)
+            self.order.append(name)
+
+        for name in sorted(set(names)):
+            visit(name)
+
+    def evaluate(self, candles: List[Dict], values: Dict) -> Dict:
+        """Compute every indicator once, dependencies first, on top of the provided values"""
+        for name in self.order:
+            values[name] = INDICATORS[name].compute(candles, values)
+        return values
+
+# Library indicators; each value is the indicator at the last candle
+@register_indicator('closes')
+def _closes(candles: List[Dict], values: Dict) -> List[float]:
+    return [c['close'] for c in candles]
+
+@register_indicator('ema20', deps=('closes',))
+def _ema20(candles: List[Dict], values: Dict) -> Optional[float]:
+    return indicators.ema(values['closes'], 20)[-1]
+
+@register_indicator('ema50', deps=('closes',))
+def _ema50(candles: List[Dict], values: Dict) -> Optional[float]:
+    return indicators.ema(values['closes'], 50)[-1]
+
+@register_indicator('rsi', deps=('closes',))
+def _rsi(candles: List[Dict], values: Dict) -> Optional[float]:
+    return indicators.rsi(values['closes'])[-1]
+
+@register_indicator('macd', deps=('closes',))
+def _macd(candles: List[Dict], values: Dict) -> Tuple[Optional[float], Optional[float], Optional[float]]:
+    return indicators.macd(values['closes'])[-1]
+
+@register_indicator('bollinger', deps=('closes',))
+def _bollinger(candles: List[Dict], values: Dict) -> Tuple[Optional[float], Optional[float], Optional[float]]:
+    return indicators.bollinger(values['closes'])[-1]
+
+@register_indicator('atr')
+def _atr(candles: List[Dict], values: Dict) -> Optional[float]:
+    return indicators.atr(candles, ATR_PERIOD)[-1]
+
+class Strategy:
+    """Scores one timeframe from indicator values; timeframes are combined by weight.
+
+    Subclasses declare the indicators they read and must keep ``score``
+    within 0-100, which the cascade's confidence bound relies on.
+    """
+
+    name = ''
+    indicators: Tuple[str, ...] = ()
+
+    def score(self, values: Dict) -> float:
+        raise NotImplementedError
+
+    def direction(self, values: Dict) -> str:
+        return values['trend']['direction']
+
+    def combine(self, timeframe_values: Dict) -> Tuple[int, Optional[str]]:
+        """Final (confidence, direction); direction is None when trends are neutral or tied"""
+        combined_score = 0
+        total_weight = 0
+        directions = []
+
+        # Always in TIMEFRAMES order, whatever order they were analyzed in
+        for tf in TIMEFRAMES:
+            values = timeframe_values.get(tf)
+            if values is None:
+                continue
+
+            weight = values['weight']
+            combined_score += self.score(values) * weight
+            total_weight += weight
+
+            direction = self.direction(values)
+            if direction != 'NEUTRAL':
+                directions.append(direction)
+
+        # Average score
+        final_score = (combined_score / total_weight) if total_weight > 0 else 0
+
+        # Determine final direction
+        if not directions:
+            return 0, None
+
+        long_count = directions.count('LONG')
+        short_count = directions.count('SHORT')
+
+        if long_count > short_count:
+            final_direction = 'LONG'
+            alignment_bonus = (long_count / len(directions)) * 100
+        elif short_count > long_count:
+            final_direction = 'SHORT'
+            alignment_bonus = (short_count / len(directions)) * 100
+        else:
+            return 0, None
+
+        # Adjust final score with alignment
+        final_score = (final_score + alignment_bonus) / 2
+
+        # Round to integer
+        return int(round(final_score)), final_direction
+
+    def bound(self, timeframe_values: Dict, pending: List[str]) -> float:
+        """Highest confidence still reachable once the pending timeframes are analyzed.
+
+        Each pending timeframe is assumed to score 100 and agree with the
+        majority direction, which can only raise the weighted score and the
+        alignment bonus.
+        """
+        combined_score = 0
+        total_weight = 0
+        long_count = short_count = 0
+
+        for values in timeframe_values.values():
+            combined_score += self.score(values) * values['weight']
+            total_weight += values['weight']
+
+            direction = self.direction(values)
+            if direction == 'LONG':
+                long_count += 1
+            elif direction == 'SHORT':
+                short_count += 1
+
+        for tf in pending:
+            combined_score += 100 * TIMEFRAMES[tf]['weight']
+            total_weight += TIMEFRAMES[tf]['weight']
+
+        directions = long_count + short_count + len(pending)
+        if not directions or (not pending and long_count == short_count):
+            return 0.0
+
+        final_score = combined_score / total_weight
+        alignment_bonus = (max(long_count, short_count) + len(pending)) / directions * 100
+        return (final_score + alignment_bonus) / 2
+
+@register_strategy
+class TrendVolumeStrategy(Strategy):
+    """The original scoring: trend strength 40%, consistency 30%, volume 30%"""
+
+    name = 'trend_volume'
+    indicators = ('trend', 'volume')
+
+    def score(self, values: Dict) -> float:
+        trend = values['trend']
+        volume = values['volume']
+
+        tf_score = 0
+
+        # Trend score (40%)
+        if trend['strength'] >= TREND_STRENGTH_THRESHOLD:
+            tf_score += 40
+
+        # Consistency score (30%)
+        if trend['consistency'] >= 70:
+            tf_score += 30
+
+        # Volume score (30%)
+        if volume['score'] >= 80:
+            tf_score += 30
+
+        return tf_score
+
+class StrategyEngine:
+    """Evaluates every enabled strategy against one shared set of indicator values.
+
+    The indicators all strategies need are merged into one graph, so each
+    is computed once per (symbol, timeframe) however many strategies read it.
+    """
+
+    def __init__(self, names: Iterable[str] = ENABLED_STRATEGIES):
+        unknown = [name for name in names if name not in STRATEGIES]
+        if unknown:
+            raise ValueError(f"Unknown strategies: {', '.join(unknown)}")
+
+        self.strategies = [STRATEGIES[name]() for name in names]
+        self.graph = IndicatorGraph(
+            [indicator for strategy in self.strategies for indicator in strategy.indicators]
+        )
+
+    def compute(self, candles: List[Dict], values: Dict) -> Dict:
+        """Indicator values of one timeframe, on top of the analyzer's base values"""
+        return self.graph.evaluate(candles, values)
+
+    def evaluate(self, timeframe_values: Dict) -> Dict[str, Tuple[int, Optional[str]]]:
+        """(confidence, direction) of every enabled strategy, in priority order"""
+        return {strategy.name: strategy.combine(timeframe_values) for strategy in self.strategies}
+
+    def bound(self, timeframe_values: Dict, pending: List[str]) -> float:
+        """Highest confidence any strategy can still reach"""
+        return max(strategy.bound(timeframe_values, pending) for strategy in self.strategies)
@@ -0,0 +1,102 @@
+# subscriptions.py - Signal Subscription Index
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+ALL = '*'
+DIRECTIONS = ('LONG', 'SHORT')
+
+class Subscription:
+    """Signal preferences of one user; empty coin/direction sets mean 'all'"""
+
+    __slots__ = ('coins', 'directions', 'min_rr')
+
+    def __init__(self, coins: Iterable[str] = (), directions: Iterable[str] = (),
+                 min_rr: float = 0.0):
+        self.coins = frozenset(coins)
+        self.directions = frozenset(directions)
+        self.min_rr = min_rr or 0.0
+
+    def keys(self) -> List[Tuple[str, str]]:
+        """Inverted-index keys this subscription is filed under"""
+        coins = self.coins or (ALL,)
+        directions = self.directions or (ALL,)
+        return [(coin, direction) for coin in coins for direction in directions]
+
+    def to_dict(self) -> Dict:
+        return {
+            'coins': sorted(self.coins),
+            'directions': sorted(self.directions),
+            'min_rr': self.min_rr
+        }
+
+class SubscriptionIndex:
+    """Inverted index from (coin, direction) to subscribed user ids.
+
+    Users with no stored preferences are filed under (ALL, ALL), so the
+    audience of a signal is the union of four buckets and costs time
+    proportional to the matching users only.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subs: Dict[int, Subscription] = {}
+        self._index: Dict[Tuple[str, str], Set[int]] = {}
+
+    def load(self, user_ids: Iterable[int], rows: Iterable[Tuple[int, Subscription]]):
+        """Load every known user (with default preferences) and stored subscriptions"""
+        with self._lock:
+            self._subs.clear()
+            self._index.clear()
+            for user_id in user_ids:
+                self._put(user_id, Subscription())
+            for user_id, sub in rows:
+                self._put(user_id, sub)
+
+    def _put(self, user_id: int, sub: Subscription):
+        self._drop(user_id)
+        self._subs[user_id] = sub
+        for key in sub.keys():
+            self._index.setdefault(key, set()).add(user_id)
+
+    def _drop(self, user_id: int):
+        old = self._subs.pop(user_id, None)
+        if old is None:
+            return
+        for key in old.keys():
+            bucket = self._index.get(key)
+            if bucket is not None:
+                bucket.discard(user_id)
+                if not bucket:
+                    del self._index[key]
+
+    def remove(self, user_id: int):
+        with self._lock:
+            self._drop(user_id)
+
+    def set(self, user_id: int, sub: Subscription):
+        with self._lock:
+            self._put(user_id, sub)
+
+    def ensure_user(self, user_id: int):
+        """File a new user under the default (all signals) subscription"""
+        with self._lock:
+            if user_id not in self._subs:
+                self._put(user_id, Subscription())
+
+    def get(self, user_id: int) -> Subscription:
+        return self._subs.get(user_id) or Subscription()
+
+    def match(self, coin: str, direction: str, rr_ratio: Optional[float] = None) -> Set[int]:
+        """User ids subscribed to a (coin, direction) signal with the given RR"""
+        with self._lock:
+            matched = set()
+            for key in ((coin, direction), (coin, ALL), (ALL, direction), (ALL, ALL)):
+                bucket = self._index.get(key)
+                if bucket:
+                    matched.update(bucket)
+
+            if rr_ratio is not None:
+                matched = {user_id for user_id in matched
+                           if self._subs[user_id].min_rr <= rr_ratio}
+
+            return matched
@@ -0,0 +1,156 @@
+# triggers.py - Price-indexed TP/SL Triggers
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+class TriggerHit(NamedTuple):
+    signal_id: int
+    kind: str  # 'tp' or 'sl'
+    level: int  # TP number (1-4), 0 for SL
+    price: float
+
+class _Thresholds:
+    """Trigger prices kept sorted, with the trigger entries in a parallel list"""
+
+    def __init__(self):
+        self.prices: List[float] = []
+        self.entries: List[Tuple[int, str, int]] = []
+
+    def add(self, price: float, entry: Tuple[int, str, int]):
+        i = bisect_right(self.prices, price)
+        self.prices.insert(i, price)
+        self.entries.insert(i, entry)
+
+    def remove(self, price: float, entry: Tuple[int, str, int]):
+        i = bisect_left(self.prices, price)
+        while i < len(self.prices) and self.prices[i] == price:
+            if self.entries[i] == entry:
+                del self.prices[i]
+                del self.entries[i]
+                return
+            i += 1
+
+    def at_or_below(self, price: float) -> List[Tuple[int, str, int]]:
+        return self.entries[:bisect_right(self.prices, price)]
+
+    def at_or_above(self, price: float) -> List[Tuple[int, str, int]]:
+        return self.entries[bisect_left(self.prices, price):]
+
+    def __len__(self) -> int:
+        return len(self.prices)
+
+class SymbolTriggers:
+    """Pending TP/SL triggers of the active signals on one symbol.
+
+    Each signal registers two triggers: its next take profit and its stop
+    loss. "Up" triggers fire when price rises to them (LONG TPs, SHORT SLs),
+    "down" triggers when price falls to them (LONG SLs, SHORT TPs). A price
+    range bisects to exactly the crossed triggers in O(log n + k).
+    """
+
+    def __init__(self):
+        self.up = _Thresholds()
+        self.down = _Thresholds()
+        self._signals: Dict[int, Tuple[Dict, int]] = {}
+
+    def _tp_side(self, signal: Dict) -> _Thresholds:
+        return self.up if signal['direction'] == 'LONG' else self.down
+
+    def _sl_side(self, signal: Dict) -> _Thresholds:
+        return self.down if signal['direction'] == 'LONG' else self.up
+
+    def add(self, signal: Dict, tp_index: int = 0):
+        """Register a signal's TP at tp_index (0-based) and its SL"""
+        signal_id = signal['id']
+        self.remove(signal_id)
+
+        self._signals[signal_id] = (signal, tp_index)
+        self._tp_side(signal).add(signal['take_profits'][tp_index], (signal_id, 'tp', tp_index + 1))
+        self._sl_side(signal).add(signal['stop_loss'], (signal_id, 'sl', 0))
+
+    def remove(self, signal_id: int):
+        entry = self._signals.pop(signal_id, None)
+        if entry is None:
+            return
+
+        signal, tp_index = entry
+        self._tp_side(signal).remove(signal['take_profits'][tp_index], (signal_id, 'tp', tp_index + 1))
+        self._sl_side(signal).remove(signal['stop_loss'], (signal_id, 'sl', 0))
+
+    def advance(self, signal_id: int) -> bool:
+        """Move a signal's TP trigger to its next level; False when it was the last one"""
+        signal, tp_index = self._signals[signal_id]
+        if tp_index + 1 >= len(signal['take_profits']):
+            return False
+
+        side = self._tp_side(signal)
+        side.remove(signal['take_profits'][tp_index], (signal_id, 'tp', tp_index + 1))
+        side.add(signal['take_profits'][tp_index + 1], (signal_id, 'tp', tp_index + 2))
+        self._signals[signal_id] = (signal, tp_index + 1)
+        return True
+
+    def advance_through(self, signal_id: int, price: float) -> int:
+        """Advance the TP trigger past every level the price reached; returns the highest TP hit"""
+        signal, tp_index = self._signals[signal_id]
+        reached = (lambda tp: price >= tp) if signal['direction'] == 'LONG' else (lambda tp: price <= tp)
+
+        highest = 0
+        while reached(signal['take_profits'][tp_index]):
+            highest = tp_index + 1
+            if not self.advance(signal_id):
+                break
+            tp_index += 1
+
+        return highest
+
+    def cross(self, high: float, low: float) -> List[TriggerHit]:
+        """Triggers crossed by a price range (a single price when high == low)"""
+        hits = []
+        for signal_id, kind, level in self.up.at_or_below(high):
+            hits.append(TriggerHit(signal_id, kind, level, self._price(signal_id, kind)))
+        for signal_id, kind, level in self.down.at_or_above(low):
+            hits.append(TriggerHit(signal_id, kind, level, self._price(signal_id, kind)))
+        return hits
+
+    def _price(self, signal_id: int, kind: str) -> float:
+        signal, tp_index = self._signals[signal_id]
+        return signal['take_profits'][tp_index] if kind == 'tp' else signal['stop_loss']
+
+    def signal(self, signal_id: int) -> Optional[Dict]:
+        entry = self._signals.get(signal_id)
+        return entry[0] if entry else None
+
+    def signal_ids(self) -> List[int]:
+        return list(self._signals)
+
+    def __contains__(self, signal_id: int) -> bool:
+        return signal_id in self._signals
+
+    def __len__(self) -> int:
+        return len(self._signals)
+
+class TriggerIndex:
+    """Per-symbol trigger books for all active signals"""
+
+    def __init__(self):
+        self._books: Dict[str, SymbolTriggers] = {}
+
+    def book(self, symbol: str) -> SymbolTriggers:
+        book = self._books.get(symbol)
+        if book is None:
+            book = self._books[symbol] = SymbolTriggers()
+        return book
+
+    def retain(self, signal_ids: List[int]):
+        """Drop triggers of every signal not in signal_ids (closed elsewhere)"""
+        keep = set(signal_ids)
+        for symbol, book in list(self._books.items()):
+            for signal_id in book.signal_ids():
+                if signal_id not in keep:
+                    book.remove(signal_id)
+            if not book:
+                del self._books[symbol]
+
+    def on_price(self, symbol: str, price: float) -> List[TriggerHit]:
+        """Triggers crossed by a new price of a symbol"""
+        book = self._books.get(symbol)
+        return book.cross(price, price) if book else []
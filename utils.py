@@ -33,8 +33,8 @@ def format_tp_message(signal_number: int, coin: str, profit_percent: float) -> s
     
     return message
 
-def format_daily_summary(stats: Dict) -> str:
-    """Format daily summary message"""
+def format_daily_summary(stats: Dict, week: Dict = None, month: Dict = None) -> str:
+    """Format daily summary message (with week/month-to-date rollups when given)"""
     
     today = datetime.now().strftime('%d/%m/%Y')
     
@@ -55,13 +55,64 @@ def format_daily_summary(stats: Dict) -> str:
 
 🎯 Tỷ lệ thành công: {success_rate:.1f}%
 💵 Có lãi: {profitable}
-
+{format_period_lines(week, month)}
 ---
 ⚡ Cảm ơn bạn đã tin tưởng AI Trading Bot!
 👑 @HOANGDUNGG789"""
     
     return message
 
+def format_period_lines(week: Dict = None, month: Dict = None) -> str:
+    """Week/month-to-date lines of the daily summary"""
+    lines = []
+    for label, row in (("Tuần này", week), ("Tháng này", month)):
+        if row:
+            lines.append(f"📅 {label}: {row['closed']} lệnh đóng, thắng {row['win_rate']:.1f}%, "
+                         f"lợi nhuận {row['total_profit']:+.2f}%")
+    return "\n" + "\n".join(lines) + "\n" if lines else ""
+
+PERIOD_LABELS = {'day': 'ngày', 'week': 'tuần', 'month': 'tháng'}
+
+def format_performance_report(period: str, coin: str, direction: str, rows: List[Dict]) -> str:
+    """Format a multi-period performance report from rollup rows (newest first)"""
+    
+    scope = "Tất cả coin" if coin == '*' else coin.replace('USDT', '')
+    if direction != '*':
+        scope += f" {direction}"
+    
+    message = f"📈 Hiệu suất theo {PERIOD_LABELS[period]} - {scope}\n"
+    if not rows:
+        return message + "\nChưa có tín hiệu nào đã đóng."
+    
+    for row in rows:
+        start = datetime.strptime(row['period_start'], '%Y-%m-%d')
+        label = start.strftime('%m/%Y') if period == 'month' else start.strftime('%d/%m/%Y')
+        message += (f"\n🗓 {label}: {row['closed']} lệnh | ✅ {row['wins']} ❌ {row['losses']} "
+                    f"({row['win_rate']:.1f}%)\n"
+                    f"   💰 Tổng {row['total_profit']:+.2f}% | TB {row['avg_profit']:+.2f}% | "
+                    f"📉 Ngược tối đa {row['max_adverse']:.2f}%")
+    
+    return message
+
+def format_subscription(subscription: Dict) -> str:
+    """Format a user's signal subscription"""
+    
+    coins = ", ".join(c.replace('USDT', '') for c in subscription['coins']) or "Tất cả"
+    directions = ", ".join(subscription['directions']) or "LONG, SHORT"
+    min_rr = f"{subscription['min_rr']:.2f}:1" if subscription['min_rr'] > 0 else "Không giới hạn"
+    
+    message = f"""🔔 Đăng ký tín hiệu của bạn:
+
+🪙 Coin: {coins}
+📈 Hướng: {directions}
+🎯 RR tối thiểu: {min_rr}
+
+/coins BTC ETH - Chọn coin (/coins all để nhận tất cả)
+/direction LONG|SHORT|ALL - Chọn hướng lệnh
+/minrr 2 - Chỉ nhận tín hiệu có RR từ 2:1 (/minrr 0 để bỏ)"""
+    
+    return message
+
 def format_number(number: float, decimals: int = 4) -> str:
     """Format number with specified decimals"""
     return f"{number:.{decimals}f}"
@@ -0,0 +1,119 @@
+# webhook.py - Webhook Delivery Server
+import hmac
+import logging
+import ssl
+
+from aiohttp import web
+from telegram import Update
+from telegram.ext import Application
+
+from config import (
+    WEBHOOK_URL, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH,
+    WEBHOOK_SECRET, WEBHOOK_SSL_CERT, WEBHOOK_SSL_KEY
+)
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+class WebhookServer:
+    """Embedded aiohttp server that feeds Telegram updates into a PTB Application.
+
+    The underlying ``web.Application`` is exposed as ``web_app`` so other
+    endpoints (metrics, health checks) can share the same process and port;
+    mount them with ``add_route`` before ``start``.
+
+    A secret token is required: without one anybody reaching the port could
+    post updates as any user, admins included.
+    """
+
+    def __init__(self, application: Application, path: str = WEBHOOK_PATH,
+                 secret: str = WEBHOOK_SECRET):
+        if not secret:
+            raise ValueError("WEBHOOK_SECRET must be set in webhook mode")
+
+        self.application = application
+        self.path = path if path.startswith('/') else f"/{path}"
+        self.secret = secret
+        self.runner = None
+
+        self.web_app = web.Application()
+        self.web_app.router.add_post(self.path, self.handle_update)
+        self.web_app.router.add_get('/healthz', self.handle_health)
+
+    def add_route(self, method: str, path: str, handler):
+        """Mount an extra endpoint (e.g. /metrics) on the webhook server"""
+        self.web_app.router.add_route(method, path, handler)
+
+    def check_secret(self, request: web.Request) -> bool:
+        """Validate the secret token Telegram sends with every update"""
+        token = request.headers.get(SECRET_HEADER, "")
+        return hmac.compare_digest(token, self.secret)
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        """Receive an update and hand it to the PTB update queue"""
+        if not self.check_secret(request):
+            logger.warning("Rejected webhook call with invalid secret token")
+            return web.Response(status=403)
+
+        try:
+            data = await request.json()
+            update = Update.de_json(data, self.application.bot)
+        except Exception as e:
+            logger.error("Invalid webhook payload: %s", e)
+            return web.Response(status=400)
+
+        if update is None:
+            return web.Response(status=400)
+
+        await self.application.update_queue.put(update)
+        return web.Response(status=200)
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        """Health check for load balancers"""
+        return web.json_response({'status': 'ok', 'running': self.application.running})
+
+    def build_ssl_context(self):
+        """Build an SSL context when a certificate is configured"""
+        if not (WEBHOOK_SSL_CERT and WEBHOOK_SSL_KEY):
+            return None
+
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        context.load_cert_chain(WEBHOOK_SSL_CERT, WEBHOOK_SSL_KEY)
+        return context
+
+    async def start(self, listen: str = WEBHOOK_LISTEN, port: int = WEBHOOK_PORT):
+        """Start serving and register the webhook with Telegram"""
+        self.runner = web.AppRunner(self.web_app)
+        await self.runner.setup()
+
+        site = web.TCPSite(self.runner, listen, port, ssl_context=self.build_ssl_context())
+        await site.start()
+        logger.info("Webhook server listening on %s:%s%s", listen, port, self.path)
+
+        # Without a public URL the server only accepts locally posted updates
+        if WEBHOOK_URL:
+            certificate = None
+            if WEBHOOK_SSL_CERT:
+                certificate = open(WEBHOOK_SSL_CERT, 'rb')
+
+            try:
+                await self.application.bot.set_webhook(
+                    url=f"{WEBHOOK_URL.rstrip('/')}{self.path}",
+                    certificate=certificate,
+                    allowed_updates=Update.ALL_TYPES,
+                    secret_token=self.secret
+                )
+            finally:
+                if certificate:
+                    certificate.close()
+
+            logger.info("Webhook registered at %s", WEBHOOK_URL)
+        else:
+            logger.warning("WEBHOOK_URL not set - webhook not registered with Telegram")
+
+    async def stop(self):
+        """Stop the HTTP server"""
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
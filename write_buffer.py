@@ -0,0 +1,85 @@
+# write_buffer.py - Write-behind Buffer
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Tuple
+
+from config import WRITE_BUFFER_INTERVAL, WRITE_BUFFER_MAX
+
+class WriteBehindBuffer:
+    """Pending database writes, coalesced by key and applied in one transaction.
+
+    A later write to the same key replaces the earlier one (last state wins),
+    so a burst of updates to one row costs a single statement at flush time.
+    Drained writes stay readable through ``get`` until ``settle`` confirms
+    their commit, so readers never see a gap between buffer and database.
+    """
+
+    def __init__(self, max_size: int = WRITE_BUFFER_MAX, interval: float = WRITE_BUFFER_INTERVAL):
+        self.max_size = max_size
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._pending: Dict[Hashable, Tuple[Callable, tuple]] = OrderedDict()
+        self._inflight: Dict[Hashable, Tuple[Callable, tuple]] = {}
+        self._oldest = None
+
+    def put(self, key: Hashable, apply: Callable, *args) -> bool:
+        """Queue ``apply(cursor, *args)``; returns True when the buffer should be flushed now"""
+        with self._lock:
+            self._pending.pop(key, None)
+            self._pending[key] = (apply, args)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            return len(self._pending) >= self.max_size
+
+    def drain(self) -> List[Tuple[Hashable, Callable, tuple]]:
+        """Take every pending write, oldest first; they stay in flight until settled"""
+        with self._lock:
+            writes = [(key, apply, args) for key, (apply, args) in self._pending.items()]
+            self._inflight.update(self._pending)
+            self._pending.clear()
+            self._oldest = None
+            return writes
+
+    def settle(self, writes: List[Tuple[Hashable, Callable, tuple]]):
+        """Forget drained writes once their transaction has committed"""
+        with self._lock:
+            for key, apply, args in writes:
+                if self._inflight.get(key) == (apply, args):
+                    del self._inflight[key]
+
+    def restore(self, writes: List[Tuple[Hashable, Callable, tuple]]):
+        """Put back drained writes after a failed flush, unless superseded meanwhile"""
+        with self._lock:
+            for key, apply, args in reversed(writes):
+                self._inflight.pop(key, None)
+                if key not in self._pending:
+                    self._pending[key] = (apply, args)
+                    self._pending.move_to_end(key, last=False)
+            if self._pending and self._oldest is None:
+                self._oldest = time.monotonic()
+
+    def get(self, key: Hashable):
+        """Arguments of the pending (or committing) write for a key, or None"""
+        with self._lock:
+            entry = self._pending.get(key) or self._inflight.get(key)
+            return entry[1] if entry else None
+
+    def overlay(self, kind: str) -> Dict[Hashable, tuple]:
+        """Arguments of every pending or committing write whose key is (kind, id), by id.
+
+        Take it before querying: a write that leaves the buffer afterwards has
+        already committed, so the query sees it.
+        """
+        with self._lock:
+            entries = {**self._inflight, **self._pending}
+            return {key[1]: args for key, (apply, args) in entries.items()
+                    if isinstance(key, tuple) and key[0] == kind}
+
+    def due(self) -> bool:
+        """True when the oldest pending write has waited a full interval"""
+        oldest = self._oldest
+        return oldest is not None and time.monotonic() - oldest >= self.interval
+
+    def __len__(self) -> int:
+        return len(self._pending)